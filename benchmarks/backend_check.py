@@ -0,0 +1,98 @@
+# coding: utf-8
+
+"""
+Equivalence check of the bit interleave backends of the C extension.
+
+encode_many and encode_uint64_many are run under every backend of _geohash.set_backend and
+compared with the pure-Python encode and encode_uint64. Backends the CPU does not support
+are skipped. The first mismatching point of each backend is reported. The extension keeps 64 bits per
+coordinate, so codes are compared up to precision 25.
+
+Usage:
+    python benchmarks/backend_check.py [--points 100000] [--precision 12] [--seed 0]
+"""
+
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geohashlite import geohash  # noqa: E402
+
+BACKENDS = ('auto', 'portable', 'bmi2', 'avx2')
+
+
+def sample_points(count, seed):
+    rng = random.Random(seed)
+    # cell borders, poles, the antimeridian and longitudes to wrap
+    latitudes = [0.0, -90.0, 89.999999, 45.0, -45.0, 1e-300, -1e-300, 0.0, 0.0, 12.5]
+    longitudes = [0.0, -180.0, 179.999999, 180.0, -180.000001, 1e-300, -1e-300, 360.0, -540.0, 200.25]
+    while len(latitudes) < count:
+        latitudes.append(rng.uniform(-90.0, 90.0))
+        longitudes.append(rng.uniform(-360.0, 360.0))
+    return latitudes[:count], longitudes[:count]
+
+
+def reference(latitudes, longitudes, precision):
+    """Codes of the pure-Python implementation"""
+    extension, geohash._geohash = geohash._geohash, None
+    try:
+        codes = [geohash.encode(lat, lon, precision) for lat, lon in zip(latitudes, longitudes)]
+        ints = [geohash.encode_uint64(lat, lon) for lat, lon in zip(latitudes, longitudes)]
+    finally:
+        geohash._geohash = extension
+    return codes, ints
+
+
+def first_mismatch(values, expected):
+    for i, (value, reference_value) in enumerate(zip(values, expected)):
+        if value != reference_value:
+            return i
+    return None if len(values) == len(expected) else min(len(values), len(expected))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--points', type=int, default=100000)
+    parser.add_argument('--precision', type=int, default=12)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if not 1 <= args.precision <= 25:
+        parser.error('precision must be between 1 and 25')
+
+    extension = geohash._geohash
+    if extension is None:
+        print('FAIL: the _geohash extension is not built')
+        return 1
+
+    latitudes, longitudes = sample_points(args.points, args.seed)
+    codes, ints = reference(latitudes, longitudes, args.precision)
+
+    failed = False
+    try:
+        for backend in BACKENDS:
+            try:
+                extension.set_backend(backend)
+            except ValueError:
+                print('{:8s} skipped, not supported on this CPU'.format(backend))
+                continue
+
+            for name, values, expected in (
+                    ('encode_many', geohash.encode_many(latitudes, longitudes, args.precision), codes),
+                    ('encode_uint64_many', list(geohash.encode_uint64_many(latitudes, longitudes)), ints)):
+                i = first_mismatch(values, expected)
+                if i is not None:
+                    failed = True
+                    print('FAIL: {} {} at ({!r}, {!r}): {!r} instead of {!r}'.format(
+                        backend, name, latitudes[i], longitudes[i], values[i], expected[i]))
+            print('{:8s} ({}) checked on {} points'.format(backend, extension.get_backend(), len(latitudes)))
+    finally:
+        extension.set_backend('auto')
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+# coding: utf-8
+
+"""
+Cold start benchmark of "import geohashlite".
+
+Each run imports the package in a fresh interpreter with -X importtime and reads the
+cumulative import time of geohashlite. The benchmark fails if the median exceeds the
+budget or if the import pulled in Shapely.
+
+Usage:
+    python benchmarks/import_time.py [--runs 20] [--budget-ms 10]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CODE = "import sys, geohashlite; sys.stdout.write(str(int('shapely' in sys.modules)))"
+
+
+def import_time_us():
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', CODE],
+                         env=env, capture_output=True, text=True, check=True)
+
+    cumulative = None
+    for line in out.stderr.splitlines():
+        fields = [f.strip() for f in line.split('|')]
+        if len(fields) == 3 and fields[2] == 'geohashlite':
+            cumulative = int(fields[1])
+
+    return cumulative, out.stdout == '1'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--budget-ms', type=float, default=10.0)
+    args = parser.parse_args()
+
+    # first run compiles the bytecode
+    import_time_us()
+
+    times = []
+    for _ in range(args.runs):
+        cumulative, shapely_loaded = import_time_us()
+        if shapely_loaded:
+            print('FAIL: import geohashlite imported shapely')
+            return 1
+        times.append(cumulative / 1000.0)
+
+    median = statistics.median(times)
+    print('import geohashlite: median {:.2f} ms, min {:.2f} ms, max {:.2f} ms over {} runs'.format(
+        median, min(times), max(times), args.runs))
+
+    if median > args.budget_ms:
+        print('FAIL: median above the budget of {:.2f} ms'.format(args.budget_ms))
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,2 +1,70 @@
-from .geohash_shape import *
+import sys
+from importlib import import_module
+from types import ModuleType
+
 from .geohash import *
+from .geohash import __all__ as _geohash_all
+from .geohash_trajectory import *
+from .geohash_trajectory import __all__ as _trajectory_all
+
+# The optional subsystems are only imported on first access so that point encoding/decoding
+# stays cheap to import: the geometry modules depend on Shapely (extra "geometry"), the
+# sketch on NumPy (extra "sketch").
+_geometry_names = {
+    'geohash_shape': (
+        'ExistedValueError', 'neighbor', 'geohash_shape', 'geohash_2_geojson', 'geojson_2_geohash',
+        'geohash_2_multipolygon', 'cascaded_union_geohash', 'geometry_2_geohash', 'add_geohash',
+        'GeohashCell', 'GeohashFeatureCollection', 'GeoJsonHasher', 'CoverUpdate', 'update_cover',
+    ),
+    'geohash_async': ('geohash_shape_async', 'iter_geojson_async', 'encode_geojson_async'),
+    'geohash_join': ('spatial_join',),
+    'geohash_cache': ('CoverCache', 'set_default_cache', 'get_default_cache'),
+}
+_sketch_names = {
+    'geohash_sketch': ('CellSketch',),
+}
+_lazy_names = {name: module
+               for modules in (_geometry_names, _sketch_names)
+               for module, names in modules.items() for name in names}
+
+# the lazy names are left out, "from geohashlite import *" must not import the optional dependencies
+__all__ = list(_geohash_all) + list(_trajectory_all)
+
+
+def _load(module):
+    # AttributeError, so that hasattr() is False when the optional dependency is missing
+    try:
+        loaded = import_module('.' + module, __name__)
+    except ImportError as e:
+        if module in _sketch_names:
+            raise AttributeError('The sketch of geohashlite requires NumPy, '
+                                 'install it with "pip install geohashlite[sketch]". ({})'.format(e)) from e
+        raise AttributeError('The geometry functions of geohashlite require Shapely, '
+                             'install it with "pip install geohashlite[geometry]". ({})'.format(e)) from e
+
+    for name, owner in _lazy_names.items():
+        if owner == module:
+            globals()[name] = getattr(loaded, name)
+
+
+def __getattr__(name):
+    if name in _lazy_names:
+        _load(_lazy_names[name])
+        return globals()[name]
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_names))
+
+
+class _Package(ModuleType):
+
+    def __setattr__(self, name, value):
+        # importing the geohash_shape submodule must not shadow the geohash_shape function
+        if name == 'geohash_shape' and isinstance(value, ModuleType):
+            value = value.geohash_shape
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
@@ -11,7 +11,7 @@ except ImportError:
     _geohash = None
 
 __version__ = "0.8.5"
-__all__ = ['encode', 'decode', 'decode_exactly', 'bbox', 'neighbors', 'expand']
+__all__ = ['encode', 'encode_many', 'zorder_argsort', 'zorder_row_groups', 'decode', 'decode_exactly', 'bbox', 'neighbors', 'expand']
 
 _base32 = '0123456789bcdefghjkmnpqrstuvwxyz'
 _base32_map = dict(zip(_base32, range(len(_base32))))
@@ -128,6 +128,30 @@ def encode(latitude, longitude, precision=12):
     return _encode_i2c(lat, lon, lat_length, lon_length)[:precision]
 
 
+def _as_doubles(values):
+    """Return values as a contiguous buffer of doubles, copying only if needed"""
+    from array import array  # not at module level, it imports collections.abc
+
+    try:
+        view = memoryview(values)
+    except TypeError:
+        return array('d', values)
+    if view.format == 'd' and view.c_contiguous:
+        return view
+    return array('d', values)
+
+
+def encode_many(latitudes, longitudes, precision=12):
+    """
+    encode sequences of latitudes and longitudes, e.g. array('d') or numpy arrays,
+    into a list of geohash codes. Longitudes are wrapped like encode does.
+    """
+    if _geohash and precision <= 26:
+        return _geohash.encode_many(_as_doubles(latitudes), _as_doubles(longitudes), precision)
+
+    return [encode(latitude, longitude, precision) for latitude, longitude in zip(latitudes, longitudes)]
+
+
 def _decode_c2i(hashcode):
     # Check if hashcode is a valid geohash code
     if not set(hashcode).issubset(_base32):
@@ -321,11 +345,97 @@ def encode_uint64(latitude, longitude):
         elif _geohash.intunit == 16:
             return (ui128[0] << 48) + (ui128[1] << 32) + (ui128[2] << 16) + ui128[3]
 
-    lat = int(((latitude + 90.0) / 180.0) * (1 << 32))
-    lon = int(((longitude + 180.0) / 360.0) * (1 << 32))
+    # exact 32 bit fixed point values, floored like encode
+    lat, lat_length = _float_hex_to_int(latitude / 90.0)
+    lon, lon_length = _float_hex_to_int(longitude / 180.0)
+    lat = lat >> (lat_length - 32) if lat_length > 32 else lat << (32 - lat_length)
+    lon = lon >> (lon_length - 32) if lon_length > 32 else lon << (32 - lon_length)
     return _uint64_interleave(lat, lon)
 
 
+def encode_uint64_many(latitudes, longitudes):
+    """
+    encode sequences of latitudes and longitudes into an array('Q') of the values of encode_uint64
+    """
+    from array import array
+
+    if _geohash and _geohash.intunit == 64:
+        codes = array('Q')
+        codes.frombytes(_geohash.encode_int_many(_as_doubles(latitudes), _as_doubles(longitudes)))
+        return codes
+
+    return array('Q', [encode_uint64(latitude, longitude) for latitude, longitude in zip(latitudes, longitudes)])
+
+
+def _as_uint64(values):
+    """Return values as a contiguous buffer of uint64, copying only if needed"""
+    from array import array
+
+    try:
+        view = memoryview(values)
+    except TypeError:
+        return array('Q', values)
+    if view.format in ('Q', 'L') and view.itemsize == 8 and view.c_contiguous:
+        return view
+    return array('Q', values)
+
+
+def zorder_argsort(latitudes, longitudes, bits=64, return_keys=False):
+    """
+    order of the points along the geohash (Z-order) curve: indices sorting the points by the
+    upper bits of their encode_uint64 values, as a memoryview of uint64 (numpy.asarray accepts it).
+    The sort is stable. If return_keys, the sorted keys truncated to bits are returned as well,
+    see zorder_row_groups.
+    """
+    from array import array
+
+    if not 1 <= bits <= 64:
+        raise ValueError("bits must be between 1 and 64")
+
+    if _geohash and _geohash.intunit == 64:
+        order, keys = _geohash.zorder_argsort(_as_doubles(latitudes), _as_doubles(longitudes), bits)
+    else:
+        mask = (0xFFFFFFFFFFFFFFFF << (64 - bits)) & 0xFFFFFFFFFFFFFFFF
+        codes = [code & mask for code in encode_uint64_many(latitudes, longitudes)]
+        order = array('Q', sorted(range(len(codes)), key=codes.__getitem__))
+        keys = array('Q', [codes[i] for i in order])
+
+    order = memoryview(order).cast('B').cast('Q')
+    if return_keys:
+        return order, memoryview(keys).cast('B').cast('Q')
+    return order
+
+
+def zorder_row_groups(keys, rows_per_group, tolerance=0.25):
+    """
+    split sorted keys (see zorder_argsort) into groups of rows_per_group rows, give or take
+    tolerance, cut where consecutive keys differ in their highest bit so that each group spans
+    as few geohash cells as possible, e.g. Parquet row groups with tight min/max statistics.
+    :return: list of (start, stop) offsets of the groups
+    """
+    if rows_per_group < 1 or not 0 <= tolerance < 1:
+        raise ValueError("rows_per_group must be positive and tolerance between 0 and 1")
+
+    min_rows = max(1, int(rows_per_group * (1 - tolerance)))
+    max_rows = max(rows_per_group, int(rows_per_group * (1 + tolerance)))
+    keys = _as_uint64(keys)
+
+    if _geohash:
+        ends = _geohash.split_sorted(keys, rows_per_group, min_rows, max_rows)
+    else:
+        ends = []
+        start = 0
+        while start < len(keys):
+            end = len(keys)
+            if end - start > max_rows:
+                end = max(range(start + min_rows, start + max_rows + 1),
+                          key=lambda i: ((keys[i - 1] ^ keys[i]).bit_length(), -abs(i - start - rows_per_group)))
+            ends.append(end)
+            start = end
+
+    return list(zip([0] + ends[:-1], ends))
+
+
 def decode_uint64(ui64):
     if _geohash:
         latlon = _geohash.decode_int(ui64 % 0xFFFFFFFFFFFFFFFF, LONG_ZERO)
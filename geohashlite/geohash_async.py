@@ -0,0 +1,137 @@
+import asyncio
+import collections
+import functools
+import logging
+
+from shapely.geometry import shape
+
+from . import geohash_cache
+from .geohash_shape import geohash_shape
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['geohash_shape_async', 'iter_geojson_async', 'encode_geojson_async']
+
+
+def _cover_geometries(geometries, precision, mode, threshold, cache):
+    """Cover a chunk of geojson geometries, executed in the executor"""
+    return [geohash_shape(shape(g), precision=precision, mode=mode, threshold=threshold, cache=cache)
+            for g in geometries]
+
+
+async def geohash_shape_async(shp, precision, mode='intersect', threshold=None, executor=None, cache=None):
+    """
+    Find list of geohashes to cover the shape without blocking the event loop.
+    See geohash_shape for the meaning of the parameters.
+
+    :param executor: executor running the cover, the default executor of the loop if None
+    :type executor: concurrent.futures.Executor
+    :param cache: cache of covers, the default cache of the calling process if None. The workers
+                  of a ProcessPoolExecutor get a copy, which only shares its disk tier.
+    :type cache: CoverCache
+    :return: list of geohashes
+    :rtype: list
+    """
+    if cache is None:
+        cache = geohash_cache.get_default_cache()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor,
+        functools.partial(geohash_shape, shp, precision=precision, mode=mode, threshold=threshold, cache=cache)
+    )
+
+
+async def iter_geojson_async(feature_collection, precision=7, mode='intersect', threshold=None,
+                             executor=None, chunk_size=16, max_pending=2, cache=None):
+    """
+    Cover each feature of a geojson feature collection in an executor, chunk by chunk.
+
+    Usage:
+        async for index, hash_codes in iter_geojson_async(fc, precision=6):
+            ...
+
+    At most max_pending chunks are submitted ahead of the consumer, so a slow consumer
+    holds back the executor. Cancelling the consuming task cancels the chunks that
+    are not started yet.
+
+    :param feature_collection: geojson feature collection
+    :param precision: precision level of geohash
+    :param mode: see geohash_shape
+    :param threshold: see geohash_shape
+    :param executor: executor running the covers, the default executor of the loop if None
+    :type executor: concurrent.futures.Executor
+    :param chunk_size: number of features covered by one executor job
+    :type chunk_size: int
+    :param max_pending: number of chunks submitted ahead of the consumer
+    :type max_pending: int
+    :param cache: cache of covers, see geohash_shape_async
+    :type cache: CoverCache
+    :return: async iterator of (feature index, list of geohashes), in feature order
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be a positive integer")
+    if max_pending < 1:
+        raise ValueError("max_pending must be a positive integer")
+    if cache is None:
+        cache = geohash_cache.get_default_cache()
+
+    loop = asyncio.get_running_loop()
+    features = feature_collection['features']
+    pending = collections.deque()
+    index = 0
+
+    try:
+        for start in range(0, len(features), chunk_size):
+            geometries = [f['geometry'] for f in features[start:start + chunk_size]]
+            pending.append(loop.run_in_executor(
+                executor, functools.partial(_cover_geometries, geometries, precision, mode, threshold, cache)
+            ))
+            if len(pending) < max_pending:
+                continue
+
+            for hash_codes in await pending.popleft():
+                yield index, hash_codes
+                index += 1
+
+        while pending:
+            for hash_codes in await pending.popleft():
+                yield index, hash_codes
+                index += 1
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+async def _encode_features_async(feature_collection, keep_json_format, precision, mode, threshold, executor,
+                                 chunk_size, max_pending, cache):
+    """Cover the features, the codes are added to their properties if keep_json_format. Return the set of codes"""
+    hash_codes = set()
+
+    async for index, li_geohash in iter_geojson_async(feature_collection, precision=precision, mode=mode,
+                                                      threshold=threshold, executor=executor,
+                                                      chunk_size=chunk_size, max_pending=max_pending,
+                                                      cache=cache):
+        if keep_json_format:
+            feature_collection['features'][index]['properties'] = {"geohash": li_geohash}
+        hash_codes.update(li_geohash)
+
+    logger.debug('Added {} geohash code.'.format(len(hash_codes)))
+    return hash_codes
+
+
+async def encode_geojson_async(feature_collection, keep_json_format=False, precision=7, mode='intersect',
+                               threshold=None, executor=None, chunk_size=16, max_pending=2, cache=None):
+    """
+    Asynchronous version of GeoJsonHasher.encode_geojson working on a feature collection.
+    See iter_geojson_async for executor, chunk_size, max_pending and cache.
+
+    :return: the feature collection with the geohash codes added to the properties of each feature
+             if keep_json_format is True, else a list of unique geohash codes
+    """
+    hash_codes = await _encode_features_async(feature_collection, keep_json_format, precision, mode, threshold,
+                                              executor, chunk_size, max_pending, cache)
+
+    if keep_json_format:
+        return feature_collection
+
+    return list(hash_codes)
@@ -0,0 +1,179 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+
+__all__ = ['CoverCache', 'set_default_cache', 'get_default_cache']
+
+_default_cache = None
+
+
+def set_default_cache(cache):
+    """
+    Set the cache used by geohash_shape when no cache is given, None disables it
+    :type cache: CoverCache
+    """
+    global _default_cache
+    _default_cache = cache
+
+
+def get_default_cache():
+    return _default_cache
+
+
+class _DirectoryStore:
+    """One compressed file per cover, written atomically so that processes can share the directory"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def get(self, key):
+        try:
+            with open(self._file(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key, value):
+        directory = os.path.dirname(self._file(key))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(value)
+            os.replace(tmp, self._file(key))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+class _SQLiteStore:
+    """Covers stored in a SQLite file, opened once per process"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+
+    def _connect(self):
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS covers (key TEXT PRIMARY KEY, value BLOB)')
+            self._pid = os.getpid()
+        return self._connection
+
+    def get(self, key):
+        with self._lock:
+            row = self._connect().execute('SELECT value FROM covers WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value):
+        with self._lock:
+            with self._connect() as connection:
+                connection.execute('INSERT OR REPLACE INTO covers (key, value) VALUES (?, ?)', (key, value))
+
+
+class CoverCache:
+    """
+    Cache of geohash covers, keyed by the hash of the WKB of the geometry and the cover options.
+
+    Covers are kept in an in-process LRU of maxsize entries. If path is given, they are also
+    stored on disk, shared between processes: in a SQLite file if path ends with .db, .sqlite
+    or .sqlite3, in a directory otherwise. Pickled copies, e.g. sent to the workers of a
+    ProcessPoolExecutor, start with an empty LRU and share the disk tier.
+    """
+
+    def __init__(self, maxsize=1024, path=None):
+        self.maxsize = maxsize
+        self.path = path
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'disk_hits': 0, 'misses': 0}
+
+        if path is None:
+            self._disk = None
+        elif path.endswith(('.db', '.sqlite', '.sqlite3')):
+            self._disk = _SQLiteStore(path)
+        else:
+            self._disk = _DirectoryStore(path)
+
+    def __reduce__(self):
+        return CoverCache, (self.maxsize, self.path)
+
+    @staticmethod
+    def key(shp, precision, mode='intersect', threshold=None):
+        """Content address of the cover of a shape"""
+        digest = hashlib.sha256(shp.wkb)
+        digest.update('|{}|{}|{!r}'.format(precision, mode, threshold).encode('ascii'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        :return: the list of geohashes stored under key, or None
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._stats['hits'] += 1
+                return list(self._memory[key])
+
+        if self._disk is not None:
+            value = self._disk.get(key)
+            if value is not None:
+                hash_codes = zlib.decompress(value).decode('ascii').split(',') if value else []
+                self._remember(key, hash_codes)
+                with self._lock:
+                    self._stats['disk_hits'] += 1
+                return list(hash_codes)
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+
+    def set(self, key, hash_codes):
+        hash_codes = tuple(hash_codes)
+        self._remember(key, hash_codes)
+        if self._disk is not None:
+            self._disk.set(key, zlib.compress(','.join(hash_codes).encode('ascii')) if hash_codes else b'')
+
+    def _remember(self, key, hash_codes):
+        with self._lock:
+            self._memory[key] = tuple(hash_codes)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.maxsize:
+                self._memory.popitem(last=False)
+
+    def get_or_compute(self, shp, precision, mode, threshold, compute):
+        """
+        Return the cached cover of the shape, calling compute(shp, precision, mode, threshold) on a miss
+        """
+        key = self.key(shp, precision, mode, threshold)
+        hash_codes = self.get(key)
+        if hash_codes is None:
+            hash_codes = compute(shp, precision, mode=mode, threshold=threshold)
+            self.set(key, hash_codes)
+        return hash_codes
+
+    def stats(self):
+        """
+        :return: dict of hits (memory), disk_hits, misses and the number of covers in memory
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._memory)
+        return stats
+
+    def clear(self):
+        """Empty the in-process tier and reset the statistics, the disk tier is kept"""
+        with self._lock:
+            self._memory.clear()
+            self._stats = {'hits': 0, 'disk_hits': 0, 'misses': 0}
@@ -0,0 +1,533 @@
+import argparse
+import csv
+import functools
+import io
+import json
+import math
+import mmap
+import os
+import sys
+import time
+from array import array
+from collections import deque
+from multiprocessing import Pool
+
+from . import geohash
+
+FORMATS = ('csv', 'ndjson', 'parquet')
+_EXTENSIONS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson', '.parquet': 'parquet'}
+_BUFFER_SIZE = 1 << 20
+
+
+def _guess_format(path, default='csv'):
+    for extension, fmt in _EXTENSIONS.items():
+        if path.endswith(extension):
+            return fmt
+    return default
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise SystemExit('Parquet input and output require pyarrow, install it with "pip install pyarrow"')
+    return pyarrow
+
+
+class InputError(ValueError):
+    """Malformed input file, reported without traceback"""
+
+
+class _RowError(ValueError):
+    """Invalid value in a row of a chunk, reported with its line number by _process_chunk"""
+
+    def __init__(self, row, message):
+        super().__init__(message)
+        self.row = row
+
+
+# Chunks are dicts of column name to list of values, so that every format and
+# every command share the same representation. Readers yield them as items
+# (unit, numbers, chunk), numbers being the line numbers of the rows of the chunk,
+# or their row numbers if unit is 'row', for the error messages.
+
+def _csv_columns(header, rows):
+    return {name: [row[i] if i < len(row) else '' for row in rows] for i, name in enumerate(header)}
+
+
+def _read_csv(stream, chunk_size, line_offset=0):
+    """
+    :param line_offset: added to the line numbers of the stream in error messages
+    """
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    rows, lines = [], []
+    for row in reader:
+        if not row:
+            continue
+        line = reader.line_num + line_offset
+        if len(row) > len(header):
+            raise InputError('line {}: {} fields, the header has {}'.format(line, len(row), len(header)))
+        # short rows are padded with empty values
+        rows.append(row)
+        lines.append(line)
+        if len(rows) == chunk_size:
+            yield 'line', lines, _csv_columns(header, rows)
+            rows, lines = [], []
+    if rows:
+        yield 'line', lines, _csv_columns(header, rows)
+
+
+def _read_ndjson(stream, chunk_size, line_offset=0):
+    """
+    :param line_offset: added to the line numbers of the stream in error messages
+    """
+    records, lines = [], []
+    for line, text in enumerate(stream, 1 + line_offset):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError as e:
+            raise InputError('line {}: invalid JSON, {}'.format(line, e))
+        if not isinstance(record, dict):
+            raise InputError('line {}: not a JSON object'.format(line))
+        records.append(record)
+        lines.append(line)
+        if len(records) == chunk_size:
+            yield 'line', lines, _columns(records)
+            records, lines = [], []
+    if records:
+        yield 'line', lines, _columns(records)
+
+
+def _columns(records):
+    keys = {}
+    for record in records:
+        keys.update(dict.fromkeys(record))
+    return {key: [record.get(key) for record in records] for key in keys}
+
+
+def _read_parquet(path, chunk_size):
+    pyarrow = _pyarrow()
+    parquet_file = pyarrow.parquet.ParquetFile(path, memory_map=True)
+    row = 1
+    for batch in parquet_file.iter_batches(batch_size=chunk_size):
+        yield 'row', range(row, row + batch.num_rows), batch.to_pydict()
+        row += batch.num_rows
+
+
+def read_chunks(path, fmt, chunk_size):
+    """
+    Stream the input file in chunks of chunk_size rows
+    :param path: input path, '-' for stdin (csv and ndjson only)
+    :param fmt: 'csv', 'ndjson' or 'parquet'
+    :return: iterator of (unit, numbers, chunk), chunk being a dict of column name to list of values
+        and numbers the line numbers of its rows, or their row numbers if unit is 'row'
+    """
+    if fmt == 'parquet':
+        if path == '-':
+            raise SystemExit('Parquet input cannot be read from stdin')
+        yield from _read_parquet(path, chunk_size)
+        return
+
+    reader = _read_csv if fmt == 'csv' else _read_ndjson
+    if path == '-':
+        yield from reader(io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline=''), chunk_size)
+        return
+    with open(path, newline='', encoding='utf-8', buffering=_BUFFER_SIZE) as stream:
+        yield from reader(stream, chunk_size)
+
+
+def read_blocks(path, chunk_size, has_header):
+    """
+    Split a csv or ndjson file into blocks of whole lines, through a memory map.
+    Records must not contain line breaks, e.g. inside quoted csv fields.
+    :param has_header: if True, the first line is returned apart as header
+    :return: header line (b'' without header) and iterator of (line number of the first line,
+        block of about chunk_size lines)
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b'', iter(())
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    end = mm.find(b'\n')
+    header = b''
+    if has_header:
+        header = mm[:end + 1] if end >= 0 else mm[:]
+
+    def blocks():
+        try:
+            pos = len(header)
+            # estimate the bytes per block from the first lines
+            sample = mm[pos:pos + (1 << 16)]
+            line_length = max(1, len(sample) // max(1, sample.count(b'\n')))
+            block_size = max(1, line_length * chunk_size)
+            line = 2 if header else 1
+            while pos < len(mm):
+                end = mm.find(b'\n', pos + block_size)
+                end = len(mm) if end < 0 else end + 1
+                block = mm[pos:end]
+                yield line, block
+                line += block.count(b'\n')
+                pos = end
+        finally:
+            mm.close()
+
+    return header, blocks()
+
+
+def _process_block(item, header, fmt, process, output_format, list_column=None):
+    """Parse a block of lines, process it and format it as output_format text, in a worker"""
+    line, block = item
+    text = block.decode('utf-8')
+    if fmt == 'csv':
+        # the first line of the block is the second line of the stream, after the header
+        items = list(_read_csv(io.StringIO(header.decode('utf-8') + text, newline=''), sys.maxsize, line - 2))
+    else:
+        items = list(_read_ndjson(io.StringIO(text), sys.maxsize, line - 1))
+    if not items:
+        return None, '', 0
+    return _format_chunk(items[0], process, output_format, list_column)
+
+
+def _process_chunk(item, process):
+    """Process the chunk of an item of read_chunks, invalid values are reported with their line number"""
+    unit, numbers, chunk = item
+    try:
+        return process(chunk)
+    except _RowError as e:
+        raise InputError('{} {}: {}'.format(unit, numbers[e.row], e))
+
+
+def _format_chunk(item, process, fmt, list_column=None):
+    """Process the chunk of an item of read_chunks and format it as csv or ndjson text, in a worker"""
+    chunk = _process_chunk(item, process)
+    rows = len(next(iter(chunk.values())))
+    return list(chunk), ChunkWriter.format_rows(chunk, fmt, list_column), rows
+
+
+class ChunkWriter:
+    """
+    Write chunks to a csv, ndjson or parquet output, '-' for stdout
+    :param list_column: column of lists of geohash codes, written separated by spaces in csv
+    """
+
+    def __init__(self, path, fmt, list_column=None):
+        self.path = path
+        self.fmt = fmt
+        self.list_column = list_column
+        self._stream = None
+        self._header_written = False
+        self._parquet = None
+
+    def __enter__(self):
+        if self.fmt == 'parquet':
+            if self.path == '-':
+                raise SystemExit('Parquet output cannot be written to stdout')
+        elif self.path == '-':
+            self._stream = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', newline='', write_through=False)
+        else:
+            self._stream = open(self.path, 'w', newline='', encoding='utf-8', buffering=_BUFFER_SIZE)
+        return self
+
+    def write(self, chunk):
+        if self.fmt == 'parquet':
+            pyarrow = _pyarrow()
+            table = pyarrow.Table.from_pydict(chunk)
+            if self._parquet is None:
+                self._parquet = pyarrow.parquet.ParquetWriter(self.path, table.schema)
+            self._parquet.write_table(table.cast(self._parquet.schema))
+            return
+
+        self.write_formatted(list(chunk), self.format_rows(chunk, self.fmt, self.list_column))
+
+    def write_formatted(self, columns, text):
+        """Write rows already formatted by format_rows, the csv header is written before the first rows"""
+        if self.fmt == 'csv' and not self._header_written:
+            csv.writer(self._stream).writerow(columns)
+        self._header_written = True
+        self._stream.write(text)
+
+    @staticmethod
+    def format_rows(chunk, fmt, list_column=None):
+        """
+        Format the rows of a chunk as csv (without header) or ndjson text. In csv, the lists of
+        list_column are separated by spaces, and the other dicts and lists are written as JSON.
+        """
+        columns = list(chunk)
+        if fmt == 'csv':
+            out = io.StringIO(newline='')
+            csv.writer(out).writerows(zip(*(_csv_values(chunk[c], c == list_column) for c in columns)))
+            return out.getvalue()
+        rows = zip(*(chunk[c] for c in columns))
+        return ''.join(json.dumps(dict(zip(columns, row))) + '\n' for row in rows)
+
+    def __exit__(self, *exc):
+        if self._parquet is not None:
+            self._parquet.close()
+        if self._stream is not None:
+            if self.path == '-':
+                self._stream.flush()
+                self._stream.detach()
+            else:
+                self._stream.close()
+
+
+def _csv_values(values, joined):
+    if joined:
+        return [' '.join(v) if isinstance(v, list) else v for v in values]
+    return [json.dumps(v) if isinstance(v, (dict, list)) else v for v in values]
+
+
+def _floats(values, column):
+    try:
+        return array('d', [float(v) for v in values])
+    except (TypeError, ValueError):
+        for row, value in enumerate(values):
+            try:
+                float(value)
+            except (TypeError, ValueError):
+                raise _RowError(row, 'invalid {} {!r}'.format(column, value))
+        raise
+
+
+def encode_chunk(chunk, lat_column, lon_column, precision, column):
+    latitudes, longitudes = _floats(chunk[lat_column], lat_column), _floats(chunk[lon_column], lon_column)
+    try:
+        chunk[column] = geohash.encode_many(latitudes, longitudes, precision)
+    except ValueError:
+        for row, (latitude, longitude) in enumerate(zip(latitudes, longitudes)):
+            if not -90.0 <= latitude < 90.0 or not math.isfinite(longitude):
+                raise _RowError(row, 'invalid coordinates {!r}, {!r}'.format(latitude, longitude))
+        raise
+    return chunk
+
+
+def decode_chunk(chunk, column, lat_column, lon_column):
+    latitudes, longitudes = [], []
+    for row, code in enumerate(chunk[column]):
+        try:
+            if not code:
+                raise ValueError('empty geohash code')
+            latitude, longitude = geohash.decode(code)
+        except (TypeError, ValueError):
+            raise _RowError(row, 'invalid {} {!r}'.format(column, code))
+        latitudes.append(latitude)
+        longitudes.append(longitude)
+    chunk[lat_column] = latitudes
+    chunk[lon_column] = longitudes
+    return chunk
+
+
+def _geometry(value):
+    """Parse a geojson dict or string, a WKT string or WKB bytes"""
+    from shapely import wkb, wkt
+    from shapely.geometry import shape
+
+    if isinstance(value, (bytes, bytearray)):
+        return wkb.loads(bytes(value))
+    if isinstance(value, str):
+        if value.lstrip().startswith('{'):
+            value = json.loads(value)
+        else:
+            return wkt.loads(value)
+    if value.get('type') == 'Feature':
+        value = value['geometry']
+    return shape(value)
+
+
+def cover_chunk(chunk, geometry_column, precision, mode, threshold, column):
+    from shapely.errors import ShapelyError
+    from .geohash_shape import geohash_shape
+
+    covers = []
+    for row, value in enumerate(chunk[geometry_column]):
+        try:
+            geometry = _geometry(value)
+        except (AttributeError, TypeError, ValueError, ShapelyError):
+            raise _RowError(row, 'invalid {} {!r:.80}'.format(geometry_column, value))
+        covers.append(geohash_shape(geometry, precision, mode=mode, threshold=threshold))
+    chunk[column] = covers
+    return chunk
+
+
+def _hash_codes(value):
+    """Geohash codes of a list, or of a string of codes separated by spaces or a JSON list"""
+    if not isinstance(value, str):
+        return value
+    if value.lstrip().startswith('['):
+        return json.loads(value)
+    return value.split()
+
+
+def dissolve_chunk(chunk, column):
+    from shapely.geometry import shape
+    from .geohash_shape import geohash_2_multipolygon
+
+    hash_codes = [code for value in chunk[column] for code in _hash_codes(value)]
+    return [shape(geohash_2_multipolygon(hash_codes, union=True))], len(chunk[column])
+
+
+def _run(chunks, worker, jobs):
+    """
+    Apply worker to the chunks, over a pool of jobs processes, in input order.
+    At most 2 * jobs chunks are read ahead, so that the input is still streamed.
+    """
+    if jobs <= 1:
+        yield from map(worker, chunks)
+        return
+    with Pool(jobs) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(worker, (chunk,)))
+            if len(pending) >= 2 * jobs:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def _report(command, rows, started, quiet):
+    if quiet:
+        return
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    sys.stderr.write('{}: {} rows in {:.2f} s ({:,.0f} rows/s)\n'.format(command, rows, elapsed, rows / elapsed))
+
+
+def _dissolve(args, chunks):
+    from shapely.geometry import mapping
+    from shapely.ops import unary_union
+
+    parts, rows = [], 0
+    worker = functools.partial(_process_chunk, process=functools.partial(dissolve_chunk, column=args.column))
+    for part, count in _run(chunks, worker, args.jobs):
+        parts.extend(part)
+        rows += count
+    geometry = mapping(unary_union(parts)) if parts else {"type": "MultiPolygon", "coordinates": []}
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    try:
+        json.dump(geometry, output)
+        output.write('\n')
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return rows
+
+
+def _positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError('{} is not a positive integer'.format(value))
+    return number
+
+
+def _precision(value):
+    precision = int(value)
+    if not 1 <= precision <= 26:
+        raise argparse.ArgumentTypeError('precision must be between 1 and 26, got {}'.format(value))
+    return precision
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='geohashlite', description='Bulk geohash encoding, decoding and covering')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_io(p):
+        p.add_argument('input', help="input file, '-' for stdin")
+        p.add_argument('-o', '--output', default='-', help="output file, '-' for stdout (default)")
+        p.add_argument('--format', choices=FORMATS, help='input format, guessed from the extension by default')
+        p.add_argument('--output-format', choices=FORMATS, help='output format, the input format by default')
+        p.add_argument('--chunk-size', type=_positive_int, default=100000, help='rows per chunk (default 100000)')
+        p.add_argument('-j', '--jobs', type=_positive_int, default=1, help='number of worker processes (default 1)')
+        p.add_argument('-q', '--quiet', action='store_true', help='do not report the throughput on stderr')
+
+    p = subparsers.add_parser('encode', help='add the geohash of the lat/lon columns')
+    add_io(p)
+    p.add_argument('-p', '--precision', type=_precision, default=12)
+    p.add_argument('--lat', default='lat', help='latitude column (default lat)')
+    p.add_argument('--lon', default='lon', help='longitude column (default lon)')
+    p.add_argument('--column', default='geohash', help='output column (default geohash)')
+
+    p = subparsers.add_parser('decode', help='add the center coordinates of the geohash column')
+    add_io(p)
+    p.add_argument('--column', default='geohash', help='geohash column (default geohash)')
+    p.add_argument('--lat', default='lat', help='output latitude column (default lat)')
+    p.add_argument('--lon', default='lon', help='output longitude column (default lon)')
+
+    p = subparsers.add_parser('cover', help='add the geohashes covering the geometry column')
+    add_io(p)
+    p.add_argument('-p', '--precision', type=_precision, default=7)
+    p.add_argument('--geometry', default='geometry',
+                   help='geometry column, GeoJSON, WKT or WKB (default geometry)')
+    p.add_argument('--mode', choices=('intersect', 'inside', 'center'), default='intersect')
+    p.add_argument('--threshold', type=float, default=None)
+    p.add_argument('--column', default='geohash', help='output column (default geohash)')
+
+    p = subparsers.add_parser('dissolve', help='union of the cells of the geohash column, as a GeoJSON geometry')
+    add_io(p)
+    p.add_argument('--column', default='geohash', help='geohash column, codes separated by spaces (default geohash)')
+
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        return _main(args)
+    except InputError as e:
+        parser.exit(2, '{}: error: {}: {}\n'.format(parser.prog, args.input, e))
+    except BrokenPipeError:
+        # the reader of stdout went away, e.g. "| head"
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return 1
+
+
+def _main(args):
+    fmt = args.format or _guess_format(args.input)
+    chunks = read_chunks(args.input, fmt, args.chunk_size)
+    started = time.perf_counter()
+
+    if args.command == 'dissolve':
+        _report(args.command, _dissolve(args, chunks), started, args.quiet)
+        return 0
+
+    if args.command == 'encode':
+        worker = functools.partial(encode_chunk, lat_column=args.lat, lon_column=args.lon,
+                                   precision=args.precision, column=args.column)
+    elif args.command == 'decode':
+        worker = functools.partial(decode_chunk, column=args.column, lat_column=args.lat, lon_column=args.lon)
+    else:
+        worker = functools.partial(cover_chunk, geometry_column=args.geometry, precision=args.precision,
+                                   mode=args.mode, threshold=args.threshold, column=args.column)
+
+    output_format = args.output_format or (_guess_format(args.output, fmt) if args.output != '-' else fmt)
+    rows = 0
+    with ChunkWriter(args.output, output_format, list_column=args.column) as writer:
+        if output_format == 'parquet':
+            for chunk in _run(chunks, functools.partial(_process_chunk, process=worker), args.jobs):
+                writer.write(chunk)
+                rows += len(chunk[args.column])
+        else:
+            # text output is formatted by the workers
+            if fmt != 'parquet' and args.input != '-':
+                # text to text: the workers also parse memory mapped blocks of lines
+                header, chunks = read_blocks(args.input, args.chunk_size, has_header=fmt == 'csv')
+                text_worker = functools.partial(_process_block, header=header, fmt=fmt, process=worker,
+                                                output_format=output_format, list_column=args.column)
+            else:
+                text_worker = functools.partial(_format_chunk, process=worker, fmt=output_format,
+                                                list_column=args.column)
+            for columns, text, count in _run(chunks, text_worker, args.jobs):
+                if columns is not None:
+                    writer.write_formatted(columns, text)
+                rows += count
+
+    _report(args.command, rows, started, args.quiet)
+    return 0
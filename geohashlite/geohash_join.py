@@ -0,0 +1,113 @@
+import logging
+
+from shapely.geometry import shape
+
+from .geohash_shape import (_VECTORIZED, _MAX_VECTORIZED_PRECISION, _cell_bits, _iter_tiles, _point_cells,
+                            np, shapely)
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['spatial_join']
+
+
+def _cover_polygons(polygons, precision):
+    """
+    Cover each polygon with the cells intersecting it
+    :return: (keys, owners, interior) arrays sorted by cell key, the index of the polygon covered by the cell
+             and whether the cell lies in the interior of that polygon
+    """
+    lat_bits, lon_bits = _cell_bits(precision)
+    per_lat = 180.0 / (1 << lat_bits)
+    per_lon = 360.0 / (1 << lon_bits)
+
+    keys, owners, interior = [], [], []
+
+    for i, shp in enumerate(polygons):
+        if shp.is_empty:
+            continue
+        shapely.prepare(shp)
+        for lat_index, lon_index, south, west in _iter_tiles(shp, precision):
+            cells = shapely.box(west, south, west + per_lon, south + per_lat)
+            hit = shapely.intersects(shp, cells)
+            if not hit.any():
+                continue
+            keys.append((lat_index[hit] << lon_bits) | lon_index[hit])
+            owners.append(np.full(np.count_nonzero(hit), i, dtype=np.int64))
+            # no point of an interior cell can lie on the boundary of the polygon
+            interior.append(shapely.contains_properly(shp, cells[hit]))
+
+    if not keys:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=bool)
+
+    keys = np.concatenate(keys)
+    order = np.argsort(keys, kind='stable')
+
+    return keys[order], np.concatenate(owners)[order], np.concatenate(interior)[order]
+
+
+def spatial_join(points_lat, points_lon, polygons, precision=6):
+    """
+    Find the polygon containing each point.
+
+    The polygons are covered with geohash cells of the given precision. Points falling in a cell
+    lying in the interior of a polygon are assigned without any geometry test, only points of the
+    cells crossed by a polygon boundary are tested exactly.
+
+    :param points_lat: array of latitudes
+    :param points_lon: array of longitudes
+    :param polygons: list of shapely geometries or geojson geometries
+    :param precision: geohash precision of the cells, at most 12. Small cells mean fewer exact
+                      tests but more cells to cover the polygons.
+    :type precision: int
+    :return: array of the index of the first polygon containing each point, -1 if there is none
+    :rtype: numpy.ndarray
+    """
+    if not _VECTORIZED:
+        raise ImportError("spatial_join requires NumPy and Shapely 2")
+    if not 1 <= precision <= _MAX_VECTORIZED_PRECISION:
+        raise ValueError("precision must be between 1 and {}".format(_MAX_VECTORIZED_PRECISION))
+
+    polygons = [p if isinstance(p, shapely.Geometry) else shape(p) for p in polygons]
+    points_lat = np.asarray(points_lat, dtype=np.float64)
+    points_lon = np.asarray(points_lon, dtype=np.float64)
+    n_points = len(points_lat)
+
+    keys, owners, interior = _cover_polygons(polygons, precision)
+    logger.debug('Covered {} polygons with {} cells.'.format(len(polygons), len(keys)))
+
+    lat_bits, lon_bits = _cell_bits(precision)
+    lat_index, lon_index, valid = _point_cells(points_lat, points_lon, precision)
+    point_keys = (lat_index << lon_bits) | lon_index
+
+    # expand every point into one (point, cell entry) pair per polygon covering its cell
+    left = np.searchsorted(keys, point_keys, side='left')
+    counts = np.searchsorted(keys, point_keys, side='right') - left
+    counts[~valid] = 0
+    starts = np.cumsum(counts) - counts
+    pair_point = np.repeat(np.arange(n_points), counts)
+    pair_entry = np.arange(len(pair_point)) - np.repeat(starts, counts) + np.repeat(left, counts)
+    pair_owner = owners[pair_entry]
+    pair_interior = interior[pair_entry]
+
+    no_match = len(polygons)
+    result = np.full(n_points, no_match, dtype=np.int64)
+    np.minimum.at(result, pair_point[pair_interior], pair_owner[pair_interior])
+
+    # exact tests, skipped when an interior cell of a previous polygon already matched
+    boundary = np.flatnonzero(~pair_interior)
+    boundary = boundary[pair_owner[boundary] < result[pair_point[boundary]]]
+    boundary = boundary[np.argsort(pair_owner[boundary], kind='stable')]
+    logger.debug('{} exact point in polygon tests.'.format(len(boundary)))
+
+    wrapped_lon = np.where((points_lon < -180.0) | (points_lon >= 180.0),
+                           np.mod(points_lon + 180.0, 360.0) - 180.0, points_lon)
+
+    owner_values, owner_starts = np.unique(pair_owner[boundary], return_index=True)
+    for owner, pairs in zip(owner_values, np.split(boundary, owner_starts[1:])):
+        points = pair_point[pairs]
+        contained = shapely.contains_xy(polygons[owner], wrapped_lon[points], points_lat[points])
+        np.minimum.at(result, points[contained], owner)
+
+    result[result == no_match] = -1
+
+    return result
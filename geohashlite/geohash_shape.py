@@ -1,12 +1,26 @@
 import logging
+from array import array
+from collections import namedtuple
 
 from shapely.geometry import box, Point, shape, geo
-from shapely.ops import cascaded_union
+from shapely.ops import unary_union
+
+try:
+    import numpy as np
+    import shapely
+    _VECTORIZED = hasattr(shapely, "contains_xy")
+except ImportError:
+    np = shapely = None
+    _VECTORIZED = False
 
 from . import geohash
+from . import geohash_cache
 
 logger = logging.getLogger(__name__)
 
+_TILE_SIZE = 1 << 16
+_MAX_VECTORIZED_PRECISION = 12
+
 
 class ExistedValueError(Exception):
     pass
@@ -28,7 +42,7 @@ def neighbor(geo_hash, direction):
     return geohash.encode(neighbor_lat, neighbor_lon, len(geo_hash))
 
 
-def geohash_shape(shp, precision, mode='intersect', threshold=None):
+def geohash_shape(shp, precision, mode='intersect', threshold=None, cache=None):
     """
     Find list of geohashes to cover the shape
     :param shp: shape to cover
@@ -42,9 +56,29 @@ def geohash_shape(shp, precision, mode='intersect', threshold=None):
     :type mode: str
     :param threshold: percentage of least coverage
     :type threshold: float
+    :param cache: cache of covers, the default cache (see geohash_cache.set_default_cache) if None
+    :type cache: CoverCache
     :return: list of geohashes
     :rtype: list
     """
+    if cache is None:
+        cache = geohash_cache.get_default_cache()
+    if cache is not None:
+        return cache.get_or_compute(shp, precision, mode, threshold, _geohash_shape)
+
+    return _geohash_shape(shp, precision, mode=mode, threshold=threshold)
+
+
+def _geohash_shape(shp, precision, mode='intersect', threshold=None):
+    """Compute the cover of geohash_shape, without cache"""
+    if _VECTORIZED and precision <= _MAX_VECTORIZED_PRECISION:
+        return _geohash_shape_vectorized(shp, precision, mode=mode, threshold=threshold)
+
+    return _geohash_shape_loop(shp, precision, mode=mode, threshold=threshold)
+
+
+def _geohash_shape_loop(shp, precision, mode='intersect', threshold=None):
+    """Cover the shape cell by cell, used when Shapely 2 and NumPy are not available"""
     (min_lon, min_lat, max_lon, max_lat) = shp.bounds
 
     hash_south_west = geohash.encode(min_lat, min_lon, precision)
@@ -64,29 +98,227 @@ def geohash_shape(shp, precision, mode='intersect', threshold=None):
     for lat in range(0, lat_step + 1):
         for lon in range(0, lon_step + 1):
             next_hash = neighbor(hash_south_west, [lat, lon])
-            if mode == 'center':
-                (lat_center, lon_center) = geohash.decode(next_hash)
-                if shp.contains(Point(lon_center, lat_center)):
-                    hash_list.append(next_hash)
-            else:
-                next_bbox = geohash.bbox(next_hash)
-                next_bbox_geom = box(next_bbox['w'], next_bbox['s'], next_bbox['e'], next_bbox['n'])
-
-                if mode == 'inside':
-                    if shp.contains(next_bbox_geom):
-                        hash_list.append(next_hash)
-                elif mode == 'intersect':
-                    if shp.intersects(next_bbox_geom):
-                        if threshold is None:
-                            hash_list.append(next_hash)
-                        else:
-                            intersected_area = shp.intersection(next_bbox_geom).area
-                            if (intersected_area / next_bbox_geom.area) >= threshold:
-                                hash_list.append(next_hash)
+            if _accept_cell(shp, next_hash, mode, threshold):
+                hash_list.append(next_hash)
 
     return hash_list
 
 
+def _accept_cell(shp, hash_code, mode, threshold):
+    """Whether the geohash cell belongs to the cover of the shape, see geohash_shape for mode and threshold"""
+    if mode == 'center':
+        (lat_center, lon_center) = geohash.decode(hash_code)
+        return shp.contains(Point(lon_center, lat_center))
+
+    next_bbox = geohash.bbox(hash_code)
+    next_bbox_geom = box(next_bbox['w'], next_bbox['s'], next_bbox['e'], next_bbox['n'])
+
+    if mode == 'inside':
+        return shp.contains(next_bbox_geom)
+    elif mode == 'intersect':
+        if shp.intersects(next_bbox_geom):
+            if threshold is None:
+                return True
+            intersected_area = shp.intersection(next_bbox_geom).area
+            return (intersected_area / next_bbox_geom.area) >= threshold
+
+    return False
+
+
+def _cell_bits(precision):
+    """Number of latitude and longitude bits of a geohash of the given precision"""
+    lat_bits = precision * 5 // 2
+    return lat_bits, precision * 5 - lat_bits
+
+
+def _cell_index(lat, lon, precision):
+    """Row and column of the geohash cell containing (lat, lon) on the global grid"""
+    (lat_center, lon_center) = geohash.decode(geohash.encode(lat, lon, precision))
+    lat_bits, lon_bits = _cell_bits(precision)
+    return (int((lat_center + 90.0) / 180.0 * (1 << lat_bits)),
+            int((lon_center + 180.0) / 360.0 * (1 << lon_bits)))
+
+
+def _encode_cells(lat_index, lon_index, precision):
+    """
+    Encode arrays of grid rows and columns into geohash strings
+    :param lat_index: row of each cell on the global grid of the given precision
+    :type lat_index: numpy.ndarray
+    :param lon_index: column of each cell on the global grid of the given precision
+    :type lon_index: numpy.ndarray
+    :param precision: geohash precision, at most 12
+    :type precision: int
+    :return: array of geohash strings
+    :rtype: numpy.ndarray
+    """
+    lat_bits, lon_bits = _cell_bits(precision)
+    lat_index = np.asarray(lat_index, dtype=np.uint64)
+    lon_index = np.asarray(lon_index, dtype=np.uint64)
+
+    # geohash bits alternate between longitude (first) and latitude
+    code = np.zeros(lat_index.shape, dtype=np.uint64)
+    for i in range(lon_bits):
+        code |= ((lon_index >> np.uint64(lon_bits - 1 - i)) & np.uint64(1)) << np.uint64(precision * 5 - 1 - 2 * i)
+    for i in range(lat_bits):
+        code |= ((lat_index >> np.uint64(lat_bits - 1 - i)) & np.uint64(1)) << np.uint64(precision * 5 - 2 - 2 * i)
+
+    chars = np.empty(lat_index.shape + (precision,), dtype=np.uint8)
+    for i in range(precision):
+        chars[..., i] = (code >> np.uint64(5 * (precision - 1 - i))) & np.uint64(0x1F)
+
+    base32 = np.frombuffer(geohash._base32.encode('ascii'), dtype=np.uint8)
+    return np.ascontiguousarray(base32[chars]).view('S{}'.format(precision))[..., 0].astype(str)
+
+
+def _point_cells(latitudes, longitudes, precision):
+    """
+    Find the grid row and column of the geohash cell of each point
+    :param latitudes: array of latitudes
+    :param longitudes: array of longitudes, wrapped into [-180.0, 180.0) like encode does
+    :param precision: geohash precision, at most 12
+    :return: (lat_index, lon_index, valid) arrays, valid is False for latitudes out of [-90.0, 90.0) and NaN
+    """
+    lat_bits, lon_bits = _cell_bits(precision)
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+
+    valid = (latitudes >= -90.0) & (latitudes < 90.0) & np.isfinite(longitudes)
+    latitudes = np.where(valid, latitudes, 0.0)
+    longitudes = np.where(valid, longitudes, 0.0)
+
+    # scaling by a power of two is exact, so the cells match the ones of encode
+    lat_index = np.floor(np.ldexp(latitudes / 90.0, lat_bits - 1)).astype(np.int64) + (1 << (lat_bits - 1))
+    lon_index = np.floor(np.ldexp(longitudes / 180.0, lon_bits - 1)).astype(np.int64) + (1 << (lon_bits - 1))
+
+    return lat_index, lon_index % (1 << lon_bits), valid
+
+
+def _iter_tiles(shp, precision):
+    """
+    Iterate over the candidate cells of the bounding box of the shape, at most _TILE_SIZE cells at a time
+    :return: iterator of (lat_index, lon_index, south, west) arrays, rows and columns of the cells
+             on the global grid and their south west corners
+    """
+    (min_lon, min_lat, max_lon, max_lat) = shp.bounds
+    lat_bits, lon_bits = _cell_bits(precision)
+
+    (lat_0, lon_0) = _cell_index(min_lat, min_lon, precision)
+    (lat_1, lon_1) = _cell_index(max_lat, max_lon, precision)
+    lon_count = 1 << lon_bits
+    if lon_1 < lon_0:
+        lon_1 += lon_count
+
+    per_lat = 180.0 / (1 << lat_bits)
+    per_lon = 360.0 / lon_count
+
+    n_cols = lon_1 - lon_0 + 1
+    tile_cols = min(n_cols, _TILE_SIZE)
+    tile_rows = max(1, _TILE_SIZE // tile_cols)
+
+    for row in range(lat_0, lat_1 + 1, tile_rows):
+        rows = np.arange(row, min(row + tile_rows, lat_1 + 1), dtype=np.int64)
+        for col in range(lon_0, lon_1 + 1, tile_cols):
+            cols = np.arange(col, min(col + tile_cols, lon_1 + 1), dtype=np.int64) % lon_count
+
+            lat_index = np.repeat(rows, len(cols))
+            lon_index = np.tile(cols, len(rows))
+            yield lat_index, lon_index, lat_index * per_lat - 90.0, lon_index * per_lon - 180.0
+
+
+def _geohash_shape_vectorized(shp, precision, mode='intersect', threshold=None):
+    """Cover the shape with Shapely 2 array predicates, tile by tile"""
+    lat_bits, lon_bits = _cell_bits(precision)
+    per_lat = 180.0 / (1 << lat_bits)
+    per_lon = 360.0 / (1 << lon_bits)
+
+    shapely.prepare(shp)
+
+    hash_list = []
+
+    for lat_index, lon_index, south, west in _iter_tiles(shp, precision):
+        accepted = _accept_cells(shp, south, west, per_lat, per_lon, mode, threshold)
+        if accepted.any():
+            hash_list.extend(_encode_cells(lat_index[accepted], lon_index[accepted], precision).tolist())
+
+    return hash_list
+
+
+def _accept_cells(shp, south, west, per_lat, per_lon, mode, threshold):
+    """Array version of _accept_cell, for the cells of the given south west corners"""
+    if mode == 'center':
+        return shapely.contains_xy(shp, west + per_lon / 2, south + per_lat / 2)
+
+    cells = shapely.box(west, south, west + per_lon, south + per_lat)
+
+    if mode == 'inside':
+        return shapely.contains(shp, cells)
+    elif mode == 'intersect':
+        accepted = shapely.intersects(shp, cells)
+        if threshold is not None and accepted.any():
+            hit = np.flatnonzero(accepted)
+            coverage = shapely.area(shapely.intersection(shp, cells[hit])) / shapely.area(cells[hit])
+            accepted[hit] = coverage >= threshold
+        return accepted
+
+    return np.zeros(len(cells), dtype=bool)
+
+
+def _filter_cells(shp, hash_codes, precision, mode, threshold):
+    """Keep the geohash codes whose cell belongs to the cover of the shape"""
+    if not (_VECTORIZED and precision <= _MAX_VECTORIZED_PRECISION):
+        return [c for c in hash_codes if _accept_cell(shp, c, mode, threshold)]
+
+    lat_bits, lon_bits = _cell_bits(precision)
+    per_lat = 180.0 / (1 << lat_bits)
+    per_lon = 360.0 / (1 << lon_bits)
+
+    # same corners as _iter_tiles, so that the predicates agree with a full cover
+    centers = np.array([geohash.decode(c) for c in hash_codes], dtype=np.float64).reshape(-1, 2)
+    south = np.floor((centers[:, 0] + 90.0) / per_lat) * per_lat - 90.0
+    west = np.floor((centers[:, 1] + 180.0) / per_lon) * per_lon - 180.0
+
+    shapely.prepare(shp)
+    accepted = _accept_cells(shp, south, west, per_lat, per_lon, mode, threshold)
+
+    return [c for c, keep in zip(hash_codes, accepted) if keep]
+
+
+CoverUpdate = namedtuple('CoverUpdate', ['cover', 'added', 'removed'])
+
+
+def update_cover(old_cover, old_geom, new_geom, precision, mode='intersect', threshold=None):
+    """
+    Update the cover of an edited geometry, only the cells touching the symmetric difference
+    of the old and new geometries are evaluated again.
+
+    :param old_cover: list of geohashes, cover of old_geom by geohash_shape with the same options
+    :param old_geom: geometry before the edit
+    :type old_geom: BaseGeometry
+    :param new_geom: geometry after the edit
+    :type new_geom: BaseGeometry
+    :param precision: geohash precision
+    :param mode: see geohash_shape
+    :param threshold: see geohash_shape
+    :return: CoverUpdate(cover, added, removed), the cover of new_geom and the lists of
+             geohashes added to and removed from old_cover
+    """
+    changed = old_geom.symmetric_difference(new_geom)
+    if changed.is_empty:
+        return CoverUpdate(list(old_cover), [], [])
+
+    candidates = _geohash_shape(changed, precision, mode='intersect')
+    accepted = set(_filter_cells(new_geom, candidates, precision, mode, threshold))
+    candidates = set(candidates)
+    logger.debug('Evaluated {} cells touching the edit.'.format(len(candidates)))
+
+    old = set(old_cover)
+    added = sorted(c for c in candidates if c in accepted and c not in old)
+    removed = set(c for c in old_cover if c in candidates and c not in accepted)
+    cover = [c for c in old_cover if c not in removed] + added
+
+    return CoverUpdate(cover, added, [c for c in old_cover if c in removed])
+
+
 def geohash_2_geojson(geohash_list):
     """
     Convert a list of geohash to a geojson feature collection
@@ -186,7 +418,7 @@ def geohash_2_multipolygon(geohash_list, union=False):
 
     if union:
         geometry_shp = shape(geometry)
-        polygon_union = cascaded_union(geometry_shp)
+        polygon_union = unary_union(geometry_shp)
         geometry = geo.mapping(polygon_union)
 
     return geometry
@@ -206,23 +438,24 @@ def cascaded_union_geohash(geohash_list):
     geometry = geohash_2_multipolygon(geohash_list)
 
     geometry_shp = shape(geometry)
-    polygon_union = cascaded_union(geometry_shp)
+    polygon_union = unary_union(geometry_shp)
 
     new_geometry = geo.mapping(polygon_union)
 
     return new_geometry
 
 
-def geometry_2_geohash(geometry, precision):
+def geometry_2_geohash(geometry, precision, cache=None):
     """
     Convert a geojson geometry to a list of geohash
 
     :param geometry: geojson geometry
     :param precision: int, length of geohash
+    :param cache: cache of covers, see geohash_shape
     :return: list of geohash (length of geohash is defined by precision)
     """
     geometry_shp = shape(geometry)
-    li_geohash = geohash_shape(geometry_shp, precision=precision)
+    li_geohash = geohash_shape(geometry_shp, precision=precision, cache=cache)
 
     return li_geohash
 
@@ -244,6 +477,102 @@ def add_geohash(feature_collection, precision):
     return feature_collection
 
 
+class GeohashCell:
+    """
+    A geohash cell, exposed as a GeoJSON feature through __geo_interface__
+    """
+    __slots__ = ('code',)
+
+    def __init__(self, code):
+        self.code = code
+
+    def __repr__(self):
+        return 'GeohashCell({!r})'.format(self.code)
+
+    def __eq__(self, other):
+        return isinstance(other, GeohashCell) and self.code == other.code
+
+    def __hash__(self):
+        return hash(self.code)
+
+    @property
+    def bbox(self):
+        return geohash.bbox(self.code)
+
+    @property
+    def geometry(self):
+        return {
+            "type": "Polygon",
+            "coordinates": GeoJsonHasher._polygon_coordinates(self.bbox)
+        }
+
+    @property
+    def __geo_interface__(self):
+        return {
+            "type": "Feature",
+            "properties": {
+                "geohash": [self.code]
+            },
+            "geometry": self.geometry
+        }
+
+
+class GeohashFeatureCollection:
+    """
+    Read-only GeoJSON feature collection with one polygon feature per geohash code.
+
+    The codes are packed into a single bytes object, the features are only created when
+    the collection is iterated or indexed. Items are GeohashCell objects, whose
+    __geo_interface__ is the feature dict. The __geo_interface__ of the collection builds
+    the dicts of all the features, like to_dict.
+    """
+    __slots__ = ('_codes', '_offsets')
+
+    def __init__(self, geohash_codes):
+        encoded = [code.encode('ascii') for code in geohash_codes]
+        self._codes = b''.join(encoded)
+        self._offsets = array('q', [0])
+        for code in encoded:
+            self._offsets.append(self._offsets[-1] + len(code))
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def _code(self, i):
+        return self._codes[self._offsets[i]:self._offsets[i + 1]].decode('ascii')
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return GeohashFeatureCollection(self._code(i) for i in range(*item.indices(len(self))))
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError('GeohashFeatureCollection index out of range')
+        return GeohashCell(self._code(item))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield GeohashCell(self._code(i))
+
+    def __repr__(self):
+        return 'GeohashFeatureCollection(<{} geohash codes>)'.format(len(self))
+
+    @property
+    def geohash_codes(self):
+        return [self._code(i) for i in range(len(self))]
+
+    @property
+    def __geo_interface__(self):
+        return self.to_dict()
+
+    def to_dict(self):
+        """Build the GeoJSON format dict, as returned by GeoJsonHasher.decode_geohash"""
+        return {
+            "type": "FeatureCollection",
+            "features": [cell.__geo_interface__ for cell in self]
+        }
+
+
 class GeoJsonHasher:
 
     def __init__(self):
@@ -278,7 +607,8 @@ class GeoJsonHasher:
             else:
                 raise TypeError("Please convert geojson to a dict")
 
-    def encode_geojson(self, keep_json_format=False, precision=7, mode='intersect', threshold=None, overwrite=False):
+    def encode_geojson(self, keep_json_format=False, precision=7, mode='intersect', threshold=None, overwrite=False,
+                       cache=None):
         """
         Encode the GeoJson format dict with a given precision
 
@@ -294,6 +624,8 @@ class GeoJsonHasher:
         :param threshold: percentage of least coverage
         :type threshold: float
         :param overwrite: if True, overwrite the existing value of the object
+        :param cache: cache of covers, see geohash_shape
+        :type cache: CoverCache
         :return: a GeoJSON format dict if keep_json_format is True, else a list of Geohash codes
         """
 
@@ -307,7 +639,8 @@ class GeoJsonHasher:
             __geohash_buffer = []
             for f in self.__geojson['features']:
                 geometry_shp = shape(f['geometry'])
-                li_geohash = geohash_shape(geometry_shp, precision=precision, mode=mode, threshold=threshold)
+                li_geohash = geohash_shape(geometry_shp, precision=precision, mode=mode, threshold=threshold,
+                                           cache=cache)
                 f['properties'] = {"geohash": li_geohash}
                 __geohash_buffer += li_geohash
 
@@ -325,14 +658,38 @@ class GeoJsonHasher:
         li_geometry = [shape(f['geometry']) for f in self.__geojson['features']]
         li_geohash = []
         for geo_shape in li_geometry:
-            hashes = geohash_shape(geo_shape, precision=precision, mode=mode, threshold=threshold)
+            hashes = geohash_shape(geo_shape, precision=precision, mode=mode, threshold=threshold, cache=cache)
             li_geohash += hashes
 
         self.__geohash_codes = list(set(li_geohash))
 
         return self.__geohash_codes
 
-    def decode_geohash(self, multipolygon=False, union=True, overwrite=False):
+    async def encode_geojson_async(self, keep_json_format=False, precision=7, mode='intersect', threshold=None,
+                                   overwrite=False, executor=None, chunk_size=16, max_pending=2, cache=None):
+        """
+        Asynchronous version of encode_geojson, the covers are computed in an executor so that
+        the event loop is not blocked. See geohash_async.iter_geojson_async for executor,
+        chunk_size, max_pending and cache.
+
+        :return: a GeoJSON format dict if keep_json_format is True, else a list of Geohash codes
+        """
+        from .geohash_async import _encode_features_async
+
+        if self.__geohash_codes and not overwrite:
+            raise ExistedValueError('The GeoJsonHasher object has existing geohash codes. '
+                                    'Set overwrite to True to overwrite it.')
+
+        hash_codes = await _encode_features_async(self.__geojson, keep_json_format, precision, mode, threshold,
+                                                  executor, chunk_size, max_pending, cache)
+        self.__geohash_codes = list(hash_codes)
+
+        if keep_json_format:
+            return self.__geojson
+
+        return self.__geohash_codes
+
+    def decode_geohash(self, multipolygon=False, union=True, overwrite=False, lazy=False):
         """
         Decode a geohash list and return a GeoJSON format dict
         :param multipolygon: by default, decode_geohash will create a GeoJSON polygon for each geohash code, by
@@ -340,8 +697,17 @@ class GeoJsonHasher:
                              will be created.
         :param union: set to True to calculate the cascaded union of all the polygons
         :param overwrite:
-        :return: a GeoJSON format dict
+        :param lazy: if True and multipolygon is False, return a GeohashFeatureCollection that creates
+                     the features on demand instead of a dict. It is not stored, geojson is left unchanged
+        :return: a GeoJSON format dict, or a GeohashFeatureCollection if lazy is True
         """
+        if lazy and not multipolygon:
+            if not self.__geohash_codes:
+                raise ValueError('GeoJsonHasher has no GeoHash codes.')
+            logger.debug('multipolygon: False, lazy: True, packing {} geohash codes.'.format(
+                len(self.__geohash_codes)))
+            return GeohashFeatureCollection(self.__geohash_codes)
+
         if self.__geojson and not overwrite:
             raise ExistedValueError('The GeoJsonHasher object has existing geojson. Set overwrite '
                                     'to True to overwrite it.')
@@ -360,7 +726,7 @@ class GeoJsonHasher:
 
             if union:
                 geometry_shp = shape(__geometry)
-                polygon_union = cascaded_union(geometry_shp)
+                polygon_union = unary_union(geometry_shp)
                 __geometry = geo.mapping(polygon_union)
                 logger.debug('Calculate cascaded union.')
 
@@ -0,0 +1,244 @@
+import struct
+import zlib
+
+import numpy as np
+
+from . import geohash
+
+__all__ = ['CellSketch']
+
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+_HEADER = struct.Struct('<4sBBBIIQq')
+_MAGIC = b'GHCS'
+_VERSION = 1
+
+
+def _splitmix64(state):
+    """Next (state, value) of the splitmix64 generator, portable seeding of the hash functions"""
+    state = (state + 0x9E3779B97F4A7C15) & _MASK64
+    z = state
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return state, z ^ (z >> 31)
+
+
+class CellSketch(object):
+    """
+    Count-min sketch of the number of points per geohash cell, with the heavy hitters.
+
+    Points are counted in their cell of the given precision and in every coarser cell, each
+    precision having its own depth x width table of counters, so that counts can be estimated
+    at any prefix length <= precision. The estimates never undercount, and overcount by at most
+    e / width of the total with probability 1 - exp(-depth). Precisions with no more than width
+    cells are counted exactly. At every other precision, the cells with the highest counts are
+    tracked as candidates for top_k, at most capacity of them.
+
+    Memory use only depends on precision, depth, width and capacity. Sketches built with the
+    same parameters and seed can be merged, e.g. from the serialized sketches of many workers.
+    """
+
+    def __init__(self, precision=8, depth=4, width=1 << 14, capacity=1024, seed=0):
+        if not 1 <= precision <= 12:
+            raise ValueError("precision must be between 1 and 12")
+        if width < 2 or width & (width - 1):
+            raise ValueError("width must be a power of two")
+        if depth < 1 or capacity < 1:
+            raise ValueError("depth and capacity must be positive")
+
+        self.precision = precision
+        self.depth = depth
+        self.width = width
+        self.capacity = capacity
+        self.seed = seed & _MASK64
+        self.total = 0
+
+        self._counts = np.zeros((precision, depth, width), dtype=np.int64)
+        # heavy hitter candidates of each precision, unused where the counts are exact
+        self._candidates = [np.zeros(0, dtype=np.uint64) for _ in range(precision)]
+
+        # multiply-shift hashing, a * x + b keeps its upper log2(width) bits
+        self._shift = np.uint64(64 - (width.bit_length() - 1))
+        state = self.seed
+        constants = []
+        for _ in range(precision * depth * 2):
+            state, value = _splitmix64(state)
+            constants.append(value)
+        self._a = np.array(constants[0::2], dtype=np.uint64).reshape(precision, depth) | np.uint64(1)
+        self._b = np.array(constants[1::2], dtype=np.uint64).reshape(precision, depth)
+
+    @property
+    def nbytes(self):
+        tracked = sum(not self._exact(level) for level in range(self.precision))
+        return self._counts.nbytes + tracked * self.capacity * 8
+
+    def _exact(self, level):
+        """Whether the cells of precision level + 1 fit in a row of counters"""
+        return 32 ** (level + 1) <= self.width
+
+    def _rows(self, level, prefixes):
+        """Counter index of the prefixes in each row of the table of precision level + 1"""
+        if self._exact(level):
+            return [prefixes.astype(np.intp)]
+        return [((prefixes * self._a[level, row] + self._b[level, row]) >> self._shift).astype(np.intp)
+                for row in range(self.depth)]
+
+    def _query(self, level, prefixes, rows=None):
+        if rows is None:
+            rows = self._rows(level, prefixes)
+        estimates = self._counts[level, 0][rows[0]]
+        for row in range(1, len(rows)):
+            estimates = np.minimum(estimates, self._counts[level, row][rows[row]])
+        return estimates
+
+    def update(self, latitudes, longitudes, weights=None):
+        """Count a batch of points, with an optional count per point"""
+        self.update_uint64(geohash.encode_uint64_many(latitudes, longitudes), weights)
+
+    def update_uint64(self, keys, weights=None):
+        """Count a batch of cells given by their encode_uint64 values"""
+        keys = np.asarray(keys, dtype=np.uint64)
+        if weights is not None:
+            weights = np.asarray(weights)
+            if weights.dtype.kind == 'f':
+                if not (np.isfinite(weights).all() and (weights == np.trunc(weights)).all()):
+                    raise ValueError("weights must be integers")
+            elif weights.dtype.kind not in 'biu':
+                raise TypeError("weights must be integers, not {}".format(weights.dtype))
+            weights = weights.astype(np.int64)
+            if weights.shape != keys.shape:
+                raise ValueError("keys and weights must have the same length")
+        if not len(keys):
+            return
+
+        for level in range(self.precision):
+            prefixes = keys >> np.uint64(64 - 5 * (level + 1))
+            rows = self._rows(level, prefixes)
+            for row, index in enumerate(rows):
+                if weights is None:
+                    self._counts[level, row] += np.bincount(index, minlength=self.width)
+                else:
+                    # not a weighted bincount, it sums in float64
+                    np.add.at(self._counts[level, row], index, weights)
+            self._track(level, prefixes, rows)
+
+        self.total += int(weights.sum()) if weights is not None else len(keys)
+
+    def _track(self, level, prefixes, rows=None):
+        """Add the cells of precision level + 1 whose estimate beats the weakest candidate"""
+        if self._exact(level):
+            return
+        candidates = self._candidates[level]
+        estimates = self._query(level, prefixes, rows)
+        if len(candidates) >= self.capacity:
+            heavier = estimates > self._query(level, candidates).min()
+            prefixes, estimates = prefixes[heavier], estimates[heavier]
+        candidates = np.union1d(candidates, self._heaviest(prefixes, estimates))
+        if len(candidates) > self.capacity:
+            estimates = self._query(level, candidates)
+            candidates = candidates[np.argpartition(-estimates, self.capacity - 1)[:self.capacity]]
+        self._candidates[level] = candidates
+
+    def _heaviest(self, prefixes, estimates):
+        """At least capacity distinct cells among the prefixes with the highest estimates, if there are as many"""
+        count = self.capacity
+        while count < len(prefixes):
+            heaviest = np.unique(prefixes[np.argpartition(-estimates, count - 1)[:count]])
+            if len(heaviest) >= self.capacity:
+                return heaviest
+            count *= 4
+        return prefixes
+
+    def estimate_uint64(self, keys, precision=None):
+        """
+        Estimated counts of the cells of the given precision containing the encode_uint64 values
+        :return: numpy array of int64
+        """
+        precision = self.precision if precision is None else precision
+        if not 1 <= precision <= self.precision:
+            raise ValueError("precision must be between 1 and {}".format(self.precision))
+        keys = np.asarray(keys, dtype=np.uint64)
+        return self._query(precision - 1, keys >> np.uint64(64 - 5 * precision))
+
+    def estimate(self, hash_codes):
+        """
+        Estimated counts of geohash cells of any length up to precision
+        :return: list of int
+        """
+        estimates = []
+        for hash_code in hash_codes:
+            if not 1 <= len(hash_code) <= self.precision:
+                raise ValueError("{} is longer than the precision of the sketch".format(hash_code))
+            prefix = 0
+            for c in hash_code:
+                prefix = (prefix << 5) + geohash._base32_map[c]
+            estimates.append(int(self._query(len(hash_code) - 1, np.array([prefix], dtype=np.uint64))[0]))
+        return estimates
+
+    def top_k(self, k=10, precision=None):
+        """
+        The k cells of the given precision with the highest estimated counts, among the tracked
+        candidates of that precision.
+        :return: list of (geohash code, estimated count), highest count first
+        """
+        precision = self.precision if precision is None else precision
+        if not 1 <= precision <= self.precision:
+            raise ValueError("precision must be between 1 and {}".format(self.precision))
+        level = precision - 1
+
+        if self._exact(level):
+            candidates = np.arange(32 ** precision, dtype=np.uint64)
+        else:
+            candidates = self._candidates[level]
+        estimates = self._query(level, candidates)
+        order = np.argsort(-estimates, kind='stable')[:k]
+
+        top = []
+        for prefix, count in zip(candidates[order].tolist(), estimates[order].tolist()):
+            if count > 0:
+                code = ''.join(geohash._base32[(prefix >> 5 * i) & 0x1F] for i in range(precision - 1, -1, -1))
+                top.append((code, count))
+        return top
+
+    def _check_compatible(self, other):
+        if (self.precision, self.depth, self.width, self.seed) != \
+                (other.precision, other.depth, other.width, other.seed):
+            raise ValueError("Only sketches of the same precision, depth, width and seed can be merged")
+
+    def merge(self, other):
+        """Add the counts of another sketch into this one"""
+        self._check_compatible(other)
+        self._counts += other._counts
+        self.total += other.total
+        for level in range(self.precision):
+            candidates = np.union1d(self._candidates[level], other._candidates[level])
+            self._candidates[level] = np.zeros(0, dtype=np.uint64)
+            self._track(level, candidates)
+        return self
+
+    def to_bytes(self):
+        """Serialize the sketch, the counters are compressed"""
+        header = _HEADER.pack(_MAGIC, _VERSION, self.precision, self.depth, self.width, self.capacity,
+                              self.seed, self.total)
+        sizes = np.array([len(candidates) for candidates in self._candidates], dtype='<u4')
+        return b''.join([header, sizes.tobytes()] +
+                        [candidates.astype('<u8').tobytes() for candidates in self._candidates] +
+                        [zlib.compress(self._counts.astype('<i8').tobytes(), 1)])
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Sketch serialized by to_bytes"""
+        magic, version, precision, depth, width, capacity, seed, total = _HEADER.unpack_from(data)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError("Not a serialized CellSketch")
+
+        sketch = cls(precision, depth, width, capacity, seed)
+        sketch.total = total
+        offset = _HEADER.size
+        sizes = np.frombuffer(data, dtype='<u4', count=precision, offset=offset).tolist()
+        offset += precision * 4
+        for level, size in enumerate(sizes):
+            sketch._candidates[level] = np.frombuffer(data, dtype='<u8', count=size, offset=offset).astype(np.uint64)
+            offset += size * 8
+        counts = np.frombuffer(zlib.decompress(data[offset:]), dtype='<i8')
+        sketch._counts = counts.astype(np.int64).reshape(precision, depth, width)
+        return sketch
@@ -0,0 +1,226 @@
+from . import geohash
+
+__all__ = ['DIRECTIONS', 'CellVisit', 'TrajectoryEncoder', 'encode_trajectory', 'iter_trajectory',
+           'decode_cell_visits', 'pack_visits', 'unpack_visits']
+
+# [lat, lon] steps to the 8 neighbors, like the direction of neighbor():
+# north, northeast, east, southeast, south, southwest, west, northwest
+DIRECTIONS = ((1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1))
+
+_FULL_CODE = 0x80
+
+
+class CellVisit(tuple):
+    """
+    Visit of a trajectory to a cell: (cell, enter_ts, exit_ts), the timestamps of the first
+    and the last fix in the cell. With deltas, cell is the index in DIRECTIONS of the cell
+    relative to the cell of the previous visit.
+    """
+    __slots__ = ()
+
+    def __new__(cls, cell, enter_ts, exit_ts):
+        return tuple.__new__(cls, (cell, enter_ts, exit_ts))
+
+    def __getnewargs__(self):
+        return tuple(self)
+
+    def __repr__(self):
+        return 'CellVisit(cell={!r}, enter_ts={!r}, exit_ts={!r})'.format(*self)
+
+    cell = property(lambda self: self[0])
+    enter_ts = property(lambda self: self[1])
+    exit_ts = property(lambda self: self[2])
+
+
+def _direction(code, other):
+    """Index in DIRECTIONS of the step from code to other, None if they are not adjacent"""
+    lat, lon, lat_length, lon_length = geohash._decode_c2i(code)
+    other_lat, other_lon = geohash._decode_c2i(other)[:2]
+    lon_cells = 1 << lon_length
+    step = (other_lat - lat, (other_lon - lon + 1) % lon_cells - 1)
+    try:
+        return DIRECTIONS.index(step)
+    except ValueError:
+        return None
+
+
+def _step(code, direction):
+    """Neighbor of code in the direction of index direction, longitudes wrap around"""
+    lat, lon, lat_length, lon_length = geohash._decode_c2i(code)
+    dlat, dlon = DIRECTIONS[direction]
+    if not 0 <= lat + dlat < 1 << lat_length:
+        raise ValueError("{} has no neighbor in direction {}".format(code, DIRECTIONS[direction]))
+    return geohash._encode_i2c(lat + dlat, lon + dlon, lat_length, lon_length)
+
+
+class TrajectoryEncoder(object):
+    """
+    Run-length encoding of a trajectory into cell visits, fed chunk by chunk.
+
+    Consecutive fixes in the same cell of the given precision are merged into one CellVisit.
+    With deltas, the visit of a cell adjacent to the previous one stores the index of its
+    direction in DIRECTIONS instead of the geohash code, see decode_cell_visits. The first
+    visit returned by each call is always a geohash code, so that the visits of every chunk
+    can be stored and decoded on their own.
+    """
+
+    def __init__(self, precision=7, deltas=False):
+        self.precision = precision
+        self.deltas = deltas
+        self._cell = self._enter_ts = self._exit_ts = None
+        self._previous = None
+
+    def update(self, timestamps, latitudes, longitudes):
+        """
+        Add the next fixes of the trajectory, timestamps in increasing order
+        :return: list of the visits completed by these fixes
+        """
+        cells = geohash.encode_many(latitudes, longitudes, self.precision)
+        if len(cells) != len(timestamps):
+            raise ValueError("timestamps, latitudes and longitudes must have the same length")
+
+        visits = []
+        self._previous = None
+        cell, enter_ts, exit_ts = self._cell, self._enter_ts, self._exit_ts
+        for code, timestamp in zip(cells, timestamps):
+            if exit_ts is not None and timestamp < exit_ts:
+                raise ValueError("timestamps must be in increasing order, {} after {}".format(timestamp, exit_ts))
+            if code != cell:
+                if cell is not None:
+                    visits.append(self._visit(cell, enter_ts, exit_ts))
+                cell = code
+                enter_ts = timestamp
+            exit_ts = timestamp
+
+        self._cell, self._enter_ts, self._exit_ts = cell, enter_ts, exit_ts
+        return visits
+
+    def flush(self):
+        """
+        End the trajectory, the next fixes start a new one
+        :return: list of the last visit, empty if there was no fix
+        """
+        visits = []
+        self._previous = None
+        if self._cell is not None:
+            visits.append(self._visit(self._cell, self._enter_ts, self._exit_ts))
+        self._cell = self._enter_ts = self._exit_ts = None
+        self._previous = None
+        return visits
+
+    def _visit(self, cell, enter_ts, exit_ts):
+        previous, self._previous = self._previous, cell
+        if self.deltas and previous is not None:
+            direction = _direction(previous, cell)
+            if direction is not None:
+                return CellVisit(direction, enter_ts, exit_ts)
+        return CellVisit(cell, enter_ts, exit_ts)
+
+
+def encode_trajectory(timestamps, latitudes, longitudes, precision=7, deltas=False):
+    """
+    Run-length encode a whole trajectory
+    :return: list of CellVisit
+    """
+    encoder = TrajectoryEncoder(precision, deltas)
+    return encoder.update(timestamps, latitudes, longitudes) + encoder.flush()
+
+
+def iter_trajectory(chunks, precision=7, deltas=False):
+    """
+    Run-length encode a trajectory read chunk by chunk
+    :param chunks: iterable of (timestamps, latitudes, longitudes)
+    :return: generator of CellVisit
+    """
+    encoder = TrajectoryEncoder(precision, deltas)
+    for timestamps, latitudes, longitudes in chunks:
+        for visit in encoder.update(timestamps, latitudes, longitudes):
+            yield visit
+    for visit in encoder.flush():
+        yield visit
+
+
+def decode_cell_visits(visits):
+    """
+    Resolve the directions of visits encoded with deltas into geohash codes
+    :param visits: iterable of CellVisit or (cell, enter_ts, exit_ts)
+    :return: generator of CellVisit
+    """
+    previous = None
+    for cell, enter_ts, exit_ts in visits:
+        if not isinstance(cell, str):
+            if previous is None:
+                raise ValueError("the first visit must be a geohash code, not a direction")
+            cell = _step(previous, cell)
+        previous = cell
+        yield CellVisit(cell, enter_ts, exit_ts)
+
+
+def _write_varint(out, value):
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def pack_visits(visits):
+    """
+    Serialize visits with integer timestamps, e.g. epoch seconds, into bytes.
+
+    A visit takes one byte for its direction, then varints of the time since the previous exit
+    and of its duration. A visit with a geohash code takes the length and the code, then its
+    absolute enter time instead of the time since the previous exit, so that the packed visits
+    of the chunks of a TrajectoryEncoder can be concatenated.
+    """
+    out = bytearray()
+    last_ts = 0
+    for cell, enter_ts, exit_ts in visits:
+        enter_ts, exit_ts = int(enter_ts), int(exit_ts)
+        if isinstance(cell, str):
+            out.append(_FULL_CODE | len(cell))
+            out += cell.encode('ascii')
+            gap = enter_ts
+        else:
+            out.append(cell)
+            gap = enter_ts - last_ts
+        _write_varint(out, gap << 1 if gap >= 0 else (-gap << 1) - 1)
+        _write_varint(out, exit_ts - enter_ts)
+        last_ts = exit_ts
+    return bytes(out)
+
+
+def unpack_visits(data):
+    """
+    Read visits serialized by pack_visits
+    :return: list of CellVisit, directions are kept as such
+    """
+    visits = []
+    offset = 0
+    last_ts = 0
+    while offset < len(data):
+        tag = data[offset]
+        offset += 1
+        if tag & _FULL_CODE:
+            length = tag & ~_FULL_CODE
+            cell = data[offset:offset + length].decode('ascii')
+            offset += length
+            last_ts = 0
+        else:
+            cell = tag
+        gap, offset = _read_varint(data, offset)
+        duration, offset = _read_varint(data, offset)
+        enter_ts = last_ts + (gap >> 1 if not gap & 1 else -((gap + 1) >> 1))
+        last_ts = enter_ts + duration
+        visits.append(CellVisit(cell, enter_ts, last_ts))
+    return visits
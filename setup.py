@@ -20,8 +20,12 @@ setup(
     license="LICENSE",
     description="A python library for interacting with geohash",
     long_description=open('README.md').read(),
-    install_requires=[
-        'shapely',
-    ],
+    extras_require={
+        'geometry': ['shapely', 'numpy'],
+        'sketch': ['numpy'],
+    },
+    entry_points={
+        'console_scripts': ['geohashlite = geohashlite.geohash_cli:main'],
+    },
     ext_modules=[c1],
 )
@@ -91,7 +91,9 @@ static inline int double_to_i64(double in, uint64_t *out){
 	int sign = x.i64 >> 63;
 	int exp = (x.i64 >> 52) & 0x7FF;
 	if(exp==0){
-		*out = UINT64_C(0x8000000000000000);
+		// zero, or subnormal: below the last bit, a negative one rounds down
+		int below_zero = sign && (x.i64 & UINT64_C(0x000FFFFFFFFFFFFF));
+		*out = UINT64_C(0x8000000000000000) - below_zero;
 		return !0;
 	}else if(exp==0x7FF){
 		return 0;
@@ -100,13 +102,19 @@ static inline int double_to_i64(double in, uint64_t *out){
 	x.i64 &= UINT64_C(0x000FFFFFFFFFFFFF);
 	x.i64 |= UINT64_C(0x0010000000000000);
 	int shift = exp - 0x3FF + 11;
+	int truncated = 0; // bits shifted out, the magnitude was rounded down
 	if(shift > 0){
 		x.i64 <<= shift;
-	}else{
+	}else if(shift > -64){
+		truncated = (x.i64 & ((UINT64_C(1) << -shift) - 1)) != 0;
 		x.i64 >>= -shift;
+	}else{
+		truncated = 1;
+		x.i64 = 0;
 	}
 	if(sign){
-		x.i64 =  UINT64_C(0x8000000000000000) - x.i64;
+		// the fixed point value is floored, like the pure Python implementation
+		x.i64 =  UINT64_C(0x8000000000000000) - x.i64 - truncated;
 	}else{
 		x.i64 += UINT64_C(0x8000000000000000);
 	}
@@ -151,6 +159,152 @@ static inline void i64_to_double(uint64_t in, double *out){
 	*out = x.d;
 }
 
+/**
+ * Accelerated bit interleave kernels.
+ *
+ * The 128 bit interleaved value is handled as two uint64_t, hi holding interleaved[0..3]
+ * and lo holding interleaved[4..7]. Longitude bits go to the odd positions, latitude bits
+ * to the even ones, as in interleave().
+ *
+ * pdep/pext (BMI2) and AVX2 are only used when the CPU reports them at runtime, the table
+ * based code above is the fallback and defines the expected results.
+ */
+#if (defined(__GNUC__) || defined(__clang__)) && defined(__x86_64__)
+#define GEOHASH_X86_DISPATCH 1
+#include <immintrin.h>
+#endif
+
+#define GEOHASH_ODD_BITS  UINT64_C(0xAAAAAAAAAAAAAAAA)
+#define GEOHASH_EVEN_BITS UINT64_C(0x5555555555555555)
+
+static int has_bmi2 = 0;
+static int has_avx2 = 0;
+static int use_bmi2 = 0;
+static int use_avx2 = 0;
+
+static void detect_cpu_features(void){
+#ifdef GEOHASH_X86_DISPATCH
+	__builtin_cpu_init();
+	has_bmi2 = __builtin_cpu_supports("bmi2") ? 1 : 0;
+	has_avx2 = __builtin_cpu_supports("avx2") ? 1 : 0;
+#endif
+	use_bmi2 = has_bmi2;
+	use_avx2 = has_avx2;
+}
+
+static struct cpu_features_init {
+	cpu_features_init(){ detect_cpu_features(); }
+} cpu_features_init_instance;
+
+static inline void interleave128_portable(uint64_t lat64, uint64_t lon64, uint64_t *hi, uint64_t *lo){
+	uint64_t r[2] = {0, 0};
+	for(int i=0; i<8; i++){
+		r[i/4] |= (uint64_t)interleave((uint8_t)(lon64>>(i*8)), (uint8_t)(lat64>>(i*8))) << ((i%4)*16);
+	}
+	*hi = r[1];
+	*lo = r[0];
+}
+
+static inline void deinterleave128_portable(uint64_t hi, uint64_t lo, uint64_t *lat64, uint64_t *lon64){
+	*lat64 = *lon64 = 0;
+	for(int i=0; i<8; i++){
+		uint8_t upper, lower;
+		deinterleave((uint16_t)((i<4 ? hi : lo)>>((3-i%4)*16)), &upper, &lower);
+		*lon64 = (*lon64<<8)+upper;
+		*lat64 = (*lat64<<8)+lower;
+	}
+}
+
+#ifdef GEOHASH_X86_DISPATCH
+__attribute__((target("bmi2")))
+static void interleave128_bmi2(uint64_t lat64, uint64_t lon64, uint64_t *hi, uint64_t *lo){
+	*hi = _pdep_u64(lon64>>32, GEOHASH_ODD_BITS) | _pdep_u64(lat64>>32, GEOHASH_EVEN_BITS);
+	*lo = _pdep_u64(lon64&0xFFFFFFFF, GEOHASH_ODD_BITS) | _pdep_u64(lat64&0xFFFFFFFF, GEOHASH_EVEN_BITS);
+}
+
+__attribute__((target("bmi2")))
+static void deinterleave128_bmi2(uint64_t hi, uint64_t lo, uint64_t *lat64, uint64_t *lon64){
+	*lon64 = (_pext_u64(hi, GEOHASH_ODD_BITS)<<32) | _pext_u64(lo, GEOHASH_ODD_BITS);
+	*lat64 = (_pext_u64(hi, GEOHASH_EVEN_BITS)<<32) | _pext_u64(lo, GEOHASH_EVEN_BITS);
+}
+
+/* spread the low 32 bits of each 64 bit lane to the even bit positions */
+__attribute__((target("avx2")))
+static inline __m256i spread_avx2(__m256i x){
+	x = _mm256_and_si256(_mm256_or_si256(x, _mm256_slli_epi64(x, 16)), _mm256_set1_epi64x(0x0000FFFF0000FFFFLL));
+	x = _mm256_and_si256(_mm256_or_si256(x, _mm256_slli_epi64(x, 8)), _mm256_set1_epi64x(0x00FF00FF00FF00FFLL));
+	x = _mm256_and_si256(_mm256_or_si256(x, _mm256_slli_epi64(x, 4)), _mm256_set1_epi64x(0x0F0F0F0F0F0F0F0FLL));
+	x = _mm256_and_si256(_mm256_or_si256(x, _mm256_slli_epi64(x, 2)), _mm256_set1_epi64x(0x3333333333333333LL));
+	x = _mm256_and_si256(_mm256_or_si256(x, _mm256_slli_epi64(x, 1)), _mm256_set1_epi64x(0x5555555555555555LL));
+	return x;
+}
+
+/* interleave count (lat64, lon64) pairs, four lanes at a time */
+__attribute__((target("avx2")))
+static size_t interleave128_many_avx2(const uint64_t *lat64, const uint64_t *lon64, size_t count, uint64_t *hi, uint64_t *lo){
+	const __m256i low32 = _mm256_set1_epi64x(0xFFFFFFFFLL);
+	size_t i = 0;
+	for(; i+4<=count; i+=4){
+		__m256i lat = _mm256_loadu_si256((const __m256i*)(lat64+i));
+		__m256i lon = _mm256_loadu_si256((const __m256i*)(lon64+i));
+		__m256i h = _mm256_or_si256(_mm256_slli_epi64(spread_avx2(_mm256_srli_epi64(lon, 32)), 1),
+			spread_avx2(_mm256_srli_epi64(lat, 32)));
+		__m256i l = _mm256_or_si256(_mm256_slli_epi64(spread_avx2(_mm256_and_si256(lon, low32)), 1),
+			spread_avx2(_mm256_and_si256(lat, low32)));
+		_mm256_storeu_si256((__m256i*)(hi+i), h);
+		_mm256_storeu_si256((__m256i*)(lo+i), l);
+	}
+	return i;
+}
+#endif /* GEOHASH_X86_DISPATCH */
+
+static inline void interleave128(uint64_t lat64, uint64_t lon64, uint64_t *hi, uint64_t *lo){
+#ifdef GEOHASH_X86_DISPATCH
+	if(use_bmi2){
+		interleave128_bmi2(lat64, lon64, hi, lo);
+		return;
+	}
+#endif
+	interleave128_portable(lat64, lon64, hi, lo);
+}
+
+static inline void deinterleave128(uint64_t hi, uint64_t lo, uint64_t *lat64, uint64_t *lon64){
+#ifdef GEOHASH_X86_DISPATCH
+	if(use_bmi2){
+		deinterleave128_bmi2(hi, lo, lat64, lon64);
+		return;
+	}
+#endif
+	deinterleave128_portable(hi, lo, lat64, lon64);
+}
+
+static void interleave128_many(const uint64_t *lat64, const uint64_t *lon64, size_t count, uint64_t *hi, uint64_t *lo){
+	size_t i = 0;
+#ifdef GEOHASH_X86_DISPATCH
+	if(use_avx2){
+		i = interleave128_many_avx2(lat64, lon64, count, hi, lo);
+	}
+#endif
+	for(; i<count; i++){
+		interleave128(lat64[i], lon64[i], hi+i, lo+i);
+	}
+}
+
+/**
+ * write the 26 character geohash of a 128 bit interleaved value, 5 bits per character
+ */
+static inline void u128_to_geohashstr(uint64_t hi, uint64_t lo, char *dst){
+	static const char* map="0123456789bcdefghjkmnpqrstuvwxyz";
+	for(int j=0; j<12; j++){
+		dst[j] = map[(hi>>(59-5*j))&0x1F];
+	}
+	dst[12] = map[((hi<<1)|(lo>>63))&0x1F];
+	for(int j=0; j<12; j++){
+		dst[13+j] = map[(lo>>(58-5*j))&0x1F];
+	}
+	dst[25] = map[(lo<<2)&0x1F];
+}
+
 static int interleaved_to_geohashstr(uint16_t *interleaved, size_t length, char* dst, size_t dst_length){
 	static const char* map="0123456789bcdefghjkmnpqrstuvwxyz";
 	if(dst_length*5 < length*16){
@@ -208,19 +362,25 @@ static int interleaved_to_geohashstr(uint16_t *interleaved, size_t length, char*
 */
 static int geohash_encode_impl(double latitude, double longitude, char* r, size_t capacity){
 	uint64_t lat64, lon64;
-	uint16_t interleaved[8];
+	uint16_t interleaved[9] = {0}; // the 26th character reads 2 bits past the 128 bit value
 	char lr[27];
 	
 	if(!double_to_i64(latitude/90.0, &lat64) || !double_to_i64(longitude/180.0, &lon64)){
 		return GEOHASH_INVALIDARGUMENT;
 	}
-	for(int i=0; i<8; i++){
-		interleaved[7-i] = interleave((uint8_t)(lon64>>(i*8)), (uint8_t)(lat64>>(i*8)));
-	}
-	
-	int ret = GEOHASH_OK;
-	if((ret=interleaved_to_geohashstr(interleaved, 8, lr, 26)) != GEOHASH_OK){
-		return ret;
+	if(use_bmi2){
+		uint64_t hi, lo;
+		interleave128(lat64, lon64, &hi, &lo);
+		u128_to_geohashstr(hi, lo, lr);
+	}else{
+		for(int i=0; i<8; i++){
+			interleaved[7-i] = interleave((uint8_t)(lon64>>(i*8)), (uint8_t)(lat64>>(i*8)));
+		}
+		
+		int ret = GEOHASH_OK;
+		if((ret=interleaved_to_geohashstr(interleaved, 8, lr, 26)) != GEOHASH_OK){
+			return ret;
+		}
 	}
 	lr[26] = '\0';
 	
@@ -238,6 +398,190 @@ int geohash_encode(double latitude, double longitude, char* r, size_t capacity){
 	return geohash_encode_impl(latitude, longitude, r, capacity);
 }
 
+#define GEOHASH_BATCH 256
+
+/*
+  fixed point coordinates of count points, longitudes are wrapped into [-180.0 180.0)
+*/
+static int coordinates_to_i64_many(const double *latitudes, const double *longitudes, size_t count,
+		uint64_t *lat64, uint64_t *lon64, size_t *failed){
+	for(size_t i=0; i<count; i++){
+		double longitude = longitudes[i];
+		if(longitude-longitude != 0.0){ // NaN or infinite
+			if(failed) *failed = i;
+			return GEOHASH_INVALIDARGUMENT;
+		}
+		while(longitude < -180.0) longitude += 360.0;
+		while(longitude >= 180.0) longitude -= 360.0;
+		if(!double_to_i64(latitudes[i]/90.0, lat64+i) || !double_to_i64(longitude/180.0, lon64+i)){
+			if(failed) *failed = i;
+			return GEOHASH_INVALIDARGUMENT;
+		}
+	}
+	return GEOHASH_OK;
+}
+
+/*
+  encode count points into geohash codes of precision characters (at most 26), written
+  back to back into r without terminator. On error, failed is set to the invalid point.
+*/
+static int geohash_encode_many_impl(const double *latitudes, const double *longitudes, size_t count,
+		char *r, size_t precision, size_t *failed){
+	uint64_t lat64[GEOHASH_BATCH], lon64[GEOHASH_BATCH], hi[GEOHASH_BATCH], lo[GEOHASH_BATCH];
+	char code[26];
+	if(precision > 26){
+		return GEOHASH_INVALIDARGUMENT;
+	}
+	for(size_t start=0; start<count; start+=GEOHASH_BATCH){
+		size_t n = count-start < GEOHASH_BATCH ? count-start : GEOHASH_BATCH;
+		int ret = coordinates_to_i64_many(latitudes+start, longitudes+start, n, lat64, lon64, failed);
+		if(ret != GEOHASH_OK){
+			if(failed) *failed += start;
+			return ret;
+		}
+		interleave128_many(lat64, lon64, n, hi, lo);
+		for(size_t i=0; i<n; i++){
+			u128_to_geohashstr(hi[i], lo[i], code);
+			memcpy(r+(start+i)*precision, code, precision);
+		}
+	}
+	return GEOHASH_OK;
+}
+int geohash_encode_many(const double *latitudes, const double *longitudes, size_t count,
+		char *r, size_t precision, size_t *failed){
+	return geohash_encode_many_impl(latitudes, longitudes, count, r, precision, failed);
+}
+
+/*
+  encode count points into the upper 64 bits of the 128 bit interleaved integer
+*/
+static int geoint_encode_many_impl(const double *latitudes, const double *longitudes, size_t count,
+		uint64_t *r, size_t *failed){
+	uint64_t lat64[GEOHASH_BATCH], lon64[GEOHASH_BATCH], lo[GEOHASH_BATCH];
+	for(size_t start=0; start<count; start+=GEOHASH_BATCH){
+		size_t n = count-start < GEOHASH_BATCH ? count-start : GEOHASH_BATCH;
+		int ret = coordinates_to_i64_many(latitudes+start, longitudes+start, n, lat64, lon64, failed);
+		if(ret != GEOHASH_OK){
+			if(failed) *failed += start;
+			return ret;
+		}
+		interleave128_many(lat64, lon64, n, r+start, lo);
+	}
+	return GEOHASH_OK;
+}
+int geoint_encode_many(const double *latitudes, const double *longitudes, size_t count,
+		uint64_t *r, size_t *failed){
+	return geoint_encode_many_impl(latitudes, longitudes, count, r, failed);
+}
+
+/*
+  stable LSD radix sort of count keys on their upper bits (1 to 64), 11 bits per pass.
+  order receives the permutation and keys are left sorted, truncated to bits. Passes on
+  a digit shared by all the keys are skipped, so clustered data takes few passes.
+*/
+static int geoint_argsort_impl(uint64_t *keys, size_t count, int bits, uint64_t *order){
+	uint64_t mask = bits >= 64 ? ~(uint64_t)0 : ~(~(uint64_t)0 >> bits);
+	int first = (64-bits)/11;
+	if(bits < 1 || bits > 64){
+		return GEOHASH_INVALIDARGUMENT;
+	}
+	
+	size_t (*histogram)[2048] = (size_t(*)[2048])calloc(6, sizeof(*histogram));
+	if(histogram==NULL){
+		return GEOHASH_NOMEMORY;
+	}
+	for(size_t i=0; i<count; i++){
+		uint64_t key = keys[i] & mask;
+		keys[i] = key;
+		order[i] = i;
+		for(int d=first; d<6; d++){
+			histogram[d][(key >> (11*d)) & 0x7FF]++;
+		}
+	}
+	
+	uint64_t *tmp_keys = (uint64_t*)malloc(count*sizeof(uint64_t));
+	uint64_t *tmp_order = (uint64_t*)malloc(count*sizeof(uint64_t));
+	if(count && (tmp_keys==NULL || tmp_order==NULL)){
+		free(histogram);
+		free(tmp_keys);
+		free(tmp_order);
+		return GEOHASH_NOMEMORY;
+	}
+	
+	uint64_t *src_keys = keys, *src_order = order, *dst_keys = tmp_keys, *dst_order = tmp_order;
+	for(int d=first; d<6; d++){
+		size_t offsets[2048], offset = 0;
+		if(count && histogram[d][(src_keys[0] >> (11*d)) & 0x7FF] == count){
+			continue;
+		}
+		for(int b=0; b<2048; b++){
+			offsets[b] = offset;
+			offset += histogram[d][b];
+		}
+		for(size_t i=0; i<count; i++){
+			size_t j = offsets[(src_keys[i] >> (11*d)) & 0x7FF]++;
+			dst_keys[j] = src_keys[i];
+			dst_order[j] = src_order[i];
+		}
+		uint64_t *swap;
+		swap = src_keys; src_keys = dst_keys; dst_keys = swap;
+		swap = src_order; src_order = dst_order; dst_order = swap;
+	}
+	if(src_keys != keys){
+		memcpy(keys, src_keys, count*sizeof(uint64_t));
+		memcpy(order, src_order, count*sizeof(uint64_t));
+	}
+	free(histogram);
+	free(tmp_keys);
+	free(tmp_order);
+	return GEOHASH_OK;
+}
+int geoint_argsort(uint64_t *keys, size_t count, int bits, uint64_t *order){
+	return geoint_argsort_impl(keys, count, bits, order);
+}
+
+static int bit_length64(uint64_t v){
+	int n = 0;
+	for(int shift=32; shift; shift>>=1){
+		if(v >> shift){
+			v >>= shift;
+			n += shift;
+		}
+	}
+	return n + (int)v;
+}
+
+/*
+  split count sorted keys into groups of min_rows to max_rows keys, cutting where the
+  keys differ in their highest bit, the closest to target rows on ties. The end of each
+  group is written into ends, the number of groups is returned.
+*/
+static size_t geoint_split_sorted_impl(const uint64_t *keys, size_t count,
+		size_t target, size_t min_rows, size_t max_rows, size_t *ends){
+	size_t groups = 0;
+	size_t start = 0;
+	while(start < count){
+		size_t end = count;
+		if(count-start > max_rows){
+			int best_score = -1;
+			size_t best_distance = 0;
+			for(size_t i=start+min_rows; i<=start+max_rows; i++){
+				uint64_t diff = keys[i-1] ^ keys[i];
+				int score = bit_length64(diff);
+				size_t distance = i > start+target ? i-start-target : start+target-i;
+				if(score > best_score || (score == best_score && distance < best_distance)){
+					best_score = score;
+					best_distance = distance;
+					end = i;
+				}
+			}
+		}
+		ends[groups++] = end;
+		start = end;
+	}
+	return groups;
+}
+
 /**
  * handle geohash string decoding operation
  */
@@ -334,11 +678,17 @@ static int geohash_decode_impl(char* r, size_t length, double *latitude, double
 	}
 	uint64_t lat64=0;
 	uint64_t lon64=0;
-	for(int i=0; i<8; i++){
-		uint8_t upper, lower;
-		deinterleave(interleaved[i], &upper, &lower);
-		lon64 = (lon64<<8)+upper;
-		lat64 = (lat64<<8)+lower;
+	if(use_bmi2){
+		uint64_t hi = ((uint64_t)interleaved[0]<<48) + ((uint64_t)interleaved[1]<<32) + ((uint64_t)interleaved[2]<<16) + (uint64_t)interleaved[3];
+		uint64_t lo = ((uint64_t)interleaved[4]<<48) + ((uint64_t)interleaved[5]<<32) + ((uint64_t)interleaved[6]<<16) + (uint64_t)interleaved[7];
+		deinterleave128(hi, lo, &lat64, &lon64);
+	}else{
+		for(int i=0; i<8; i++){
+			uint8_t upper, lower;
+			deinterleave(interleaved[i], &upper, &lower);
+			lon64 = (lon64<<8)+upper;
+			lat64 = (lat64<<8)+lower;
+		}
 	}
 	if(intr_free){
 		free(interleaved);
@@ -623,8 +973,17 @@ static PyObject *py_geoint_encode(PyObject *self, PyObject *args){
 		return NULL;
 	}
 	uint16_t interleaved[8];
-	for(int i=0; i<8; i++){
-		interleaved[7-i] = interleave((uint8_t)(lon64>>(i*8)), (uint8_t)(lat64>>(i*8)));
+	if(use_bmi2){
+		uint64_t hi, lo;
+		interleave128(lat64, lon64, &hi, &lo);
+		for(int i=0; i<4; i++){
+			interleaved[i] = (uint16_t)(hi>>((3-i)*16));
+			interleaved[4+i] = (uint16_t)(lo>>((3-i)*16));
+		}
+	}else{
+		for(int i=0; i<8; i++){
+			interleaved[7-i] = interleave((uint8_t)(lon64>>(i*8)), (uint8_t)(lat64>>(i*8)));
+		}
 	}
 
 	PyObject *ret = NULL;
@@ -711,11 +1070,17 @@ static PyObject *py_geoint_decode(PyObject *self, PyObject *args){
 	
 	uint64_t lat64=0;
 	uint64_t lon64=0;
-	for(int i=0; i<8; i++){
-		uint8_t upper, lower;
-		deinterleave(interleaved[i], &upper, &lower);
-		lon64 = (lon64<<8)+upper;
-		lat64 = (lat64<<8)+lower;
+	if(use_bmi2){
+		uint64_t hi = ((uint64_t)interleaved[0]<<48) + ((uint64_t)interleaved[1]<<32) + ((uint64_t)interleaved[2]<<16) + (uint64_t)interleaved[3];
+		uint64_t lo = ((uint64_t)interleaved[4]<<48) + ((uint64_t)interleaved[5]<<32) + ((uint64_t)interleaved[6]<<16) + (uint64_t)interleaved[7];
+		deinterleave128(hi, lo, &lat64, &lon64);
+	}else{
+		for(int i=0; i<8; i++){
+			uint8_t upper, lower;
+			deinterleave(interleaved[i], &upper, &lower);
+			lon64 = (lon64<<8)+upper;
+			lat64 = (lat64<<8)+lower;
+		}
 	}
 	double tlat, tlon;
 	i64_to_double(lat64, &tlat);
@@ -724,12 +1089,220 @@ static PyObject *py_geoint_decode(PyObject *self, PyObject *args){
 	return Py_BuildValue("(dd)", tlat*90.0, tlon*180.0);
 }
 
+static int parse_coordinate_buffers(PyObject *args, Py_buffer *lats, Py_buffer *lons, Py_ssize_t *precision){
+	int ok;
+	if(precision){
+		ok = PyArg_ParseTuple(args, "y*y*n", lats, lons, precision);
+	}else{
+		ok = PyArg_ParseTuple(args, "y*y*", lats, lons);
+	}
+	if(!ok) return 0;
+	if(lats->len != lons->len || lats->len % sizeof(double) != 0){
+		PyBuffer_Release(lats);
+		PyBuffer_Release(lons);
+		PyErr_SetString(PyExc_ValueError, "latitudes and longitudes must be buffers of the same number of doubles");
+		return 0;
+	}
+	return 1;
+}
+
+static void set_batch_error(int status, size_t failed){
+	if(status==GEOHASH_INVALIDARGUMENT){
+		PyErr_Format(PyExc_ValueError, "Invalid coordinates at index %zu", failed);
+	}else{
+		set_error(status);
+	}
+}
+
+static PyObject *py_geohash_encode_many(PyObject *self, PyObject *args){
+	Py_buffer lats, lons;
+	Py_ssize_t precision;
+	if(!parse_coordinate_buffers(args, &lats, &lons, &precision)) return NULL;
+	if(precision < 1 || precision > 26){
+		PyBuffer_Release(&lats);
+		PyBuffer_Release(&lons);
+		PyErr_SetString(PyExc_ValueError, "precision must be between 1 and 26");
+		return NULL;
+	}
+	
+	size_t count = lats.len / sizeof(double);
+	char *buffer = (char*)malloc(count*precision+1);
+	if(buffer==NULL){
+		PyBuffer_Release(&lats);
+		PyBuffer_Release(&lons);
+		return PyErr_NoMemory();
+	}
+	int ret;
+	size_t failed = 0;
+	Py_BEGIN_ALLOW_THREADS
+	ret = geohash_encode_many_impl((const double*)lats.buf, (const double*)lons.buf, count, buffer, precision, &failed);
+	Py_END_ALLOW_THREADS
+	PyBuffer_Release(&lats);
+	PyBuffer_Release(&lons);
+	if(ret != GEOHASH_OK){
+		free(buffer);
+		set_batch_error(ret, failed);
+		return NULL;
+	}
+	
+	PyObject *obj = PyList_New(count);
+	for(size_t i=0; obj && i<count; i++){
+		PyObject *code = PyUnicode_FromStringAndSize(buffer+i*precision, precision);
+		if(code==NULL){
+			Py_CLEAR(obj);
+			break;
+		}
+		PyList_SET_ITEM(obj, i, code);
+	}
+	free(buffer);
+	return obj;
+}
+
+static PyObject *py_geoint_encode_many(PyObject *self, PyObject *args){
+	Py_buffer lats, lons;
+	if(!parse_coordinate_buffers(args, &lats, &lons, NULL)) return NULL;
+	
+	size_t count = lats.len / sizeof(double);
+	PyObject *obj = PyBytes_FromStringAndSize(NULL, count*sizeof(uint64_t));
+	if(obj==NULL){
+		PyBuffer_Release(&lats);
+		PyBuffer_Release(&lons);
+		return NULL;
+	}
+	int ret;
+	size_t failed = 0;
+	uint64_t *dst = (uint64_t*)PyBytes_AS_STRING(obj);
+	Py_BEGIN_ALLOW_THREADS
+	ret = geoint_encode_many_impl((const double*)lats.buf, (const double*)lons.buf, count, dst, &failed);
+	Py_END_ALLOW_THREADS
+	PyBuffer_Release(&lats);
+	PyBuffer_Release(&lons);
+	if(ret != GEOHASH_OK){
+		Py_DECREF(obj);
+		set_batch_error(ret, failed);
+		return NULL;
+	}
+	return obj;
+}
+
+static PyObject *py_geoint_zorder_argsort(PyObject *self, PyObject *args){
+	Py_buffer lats, lons;
+	Py_ssize_t bits;
+	if(!parse_coordinate_buffers(args, &lats, &lons, &bits)) return NULL;
+	if(bits < 1 || bits > 64){
+		PyBuffer_Release(&lats);
+		PyBuffer_Release(&lons);
+		PyErr_SetString(PyExc_ValueError, "bits must be between 1 and 64");
+		return NULL;
+	}
+	
+	size_t count = lats.len / sizeof(double);
+	PyObject *keys = PyBytes_FromStringAndSize(NULL, count*sizeof(uint64_t));
+	PyObject *order = PyBytes_FromStringAndSize(NULL, count*sizeof(uint64_t));
+	if(keys==NULL || order==NULL){
+		Py_XDECREF(keys);
+		Py_XDECREF(order);
+		PyBuffer_Release(&lats);
+		PyBuffer_Release(&lons);
+		return NULL;
+	}
+	int ret;
+	size_t failed = 0;
+	uint64_t *keys_buf = (uint64_t*)PyBytes_AS_STRING(keys);
+	uint64_t *order_buf = (uint64_t*)PyBytes_AS_STRING(order);
+	Py_BEGIN_ALLOW_THREADS
+	ret = geoint_encode_many_impl((const double*)lats.buf, (const double*)lons.buf, count, keys_buf, &failed);
+	if(ret == GEOHASH_OK){
+		ret = geoint_argsort_impl(keys_buf, count, (int)bits, order_buf);
+	}
+	Py_END_ALLOW_THREADS
+	PyBuffer_Release(&lats);
+	PyBuffer_Release(&lons);
+	if(ret != GEOHASH_OK){
+		Py_DECREF(keys);
+		Py_DECREF(order);
+		set_batch_error(ret, failed);
+		return NULL;
+	}
+	return Py_BuildValue("(NN)", order, keys);
+}
+
+static PyObject *py_geoint_split_sorted(PyObject *self, PyObject *args){
+	Py_buffer keys;
+	Py_ssize_t target, min_rows, max_rows;
+	if(!PyArg_ParseTuple(args, "y*nnn", &keys, &target, &min_rows, &max_rows)) return NULL;
+	if(keys.len % sizeof(uint64_t) != 0 || min_rows < 1 || target < min_rows || max_rows < target){
+		PyBuffer_Release(&keys);
+		PyErr_SetString(PyExc_ValueError, "keys must be a buffer of uint64 and 1 <= min_rows <= target <= max_rows");
+		return NULL;
+	}
+	
+	size_t count = keys.len / sizeof(uint64_t);
+	size_t *ends = (size_t*)malloc((count/min_rows+1)*sizeof(size_t));
+	if(ends==NULL){
+		PyBuffer_Release(&keys);
+		return PyErr_NoMemory();
+	}
+	size_t groups;
+	Py_BEGIN_ALLOW_THREADS
+	groups = geoint_split_sorted_impl((const uint64_t*)keys.buf, count, target, min_rows, max_rows, ends);
+	Py_END_ALLOW_THREADS
+	PyBuffer_Release(&keys);
+	
+	PyObject *obj = PyList_New(groups);
+	for(size_t i=0; obj && i<groups; i++){
+		PyObject *end = PyLong_FromSize_t(ends[i]);
+		if(end==NULL){
+			Py_CLEAR(obj);
+			break;
+		}
+		PyList_SET_ITEM(obj, i, end);
+	}
+	free(ends);
+	return obj;
+}
+
+static PyObject *py_get_backend(PyObject *self, PyObject *args){
+	if(use_bmi2 && use_avx2) return Py_BuildValue("s", "bmi2+avx2");
+	if(use_bmi2) return Py_BuildValue("s", "bmi2");
+	if(use_avx2) return Py_BuildValue("s", "avx2");
+	return Py_BuildValue("s", "portable");
+}
+
+static PyObject *py_set_backend(PyObject *self, PyObject *args){
+	char *name;
+	if(!PyArg_ParseTuple(args, "s", &name)) return NULL;
+	
+	if(strcmp(name, "auto")==0){
+		use_bmi2 = has_bmi2;
+		use_avx2 = has_avx2;
+	}else if(strcmp(name, "portable")==0){
+		use_bmi2 = use_avx2 = 0;
+	}else if(strcmp(name, "bmi2")==0 && has_bmi2){
+		use_bmi2 = 1;
+		use_avx2 = 0;
+	}else if(strcmp(name, "avx2")==0 && has_avx2){
+		use_bmi2 = 0;
+		use_avx2 = 1;
+	}else{
+		PyErr_Format(PyExc_ValueError, "Backend %s is not supported on this CPU", name);
+		return NULL;
+	}
+	Py_RETURN_NONE;
+}
+
 static PyMethodDef GeohashMethods[] = {
 	{"encode", py_geohash_encode, METH_VARARGS, "geohash encoding."},
 	{"decode", py_geohash_decode, METH_VARARGS, "geohash decoding."},
 	{"neighbors", py_geohash_neighbors, METH_VARARGS, "geohash neighbor codes",},
 	{"encode_int", py_geoint_encode, METH_VARARGS, "encode geometric coordinates into 128bit interleaved integer(divided into some integers)"},
 	{"decode_int", py_geoint_decode, METH_VARARGS, "decode 128bit interleaved integer(divided into some integers) into geometric coordinates"},
+	{"encode_many", py_geohash_encode_many, METH_VARARGS, "geohash encoding of buffers of latitudes and longitudes (doubles)."},
+	{"encode_int_many", py_geoint_encode_many, METH_VARARGS, "encode buffers of latitudes and longitudes (doubles) into the upper 64bit of the interleaved integers, returned as bytes of native uint64"},
+	{"zorder_argsort", py_geoint_zorder_argsort, METH_VARARGS, "stable argsort of buffers of latitudes and longitudes (doubles) by the upper bits of their interleaved integers, returned as bytes of native uint64 (order, sorted keys)"},
+	{"split_sorted", py_geoint_split_sorted, METH_VARARGS, "ends of the groups of min_rows to max_rows sorted uint64 keys, cut at the highest differing bits"},
+	{"get_backend", py_get_backend, METH_NOARGS, "name of the bit interleave backend in use."},
+	{"set_backend", py_set_backend, METH_VARARGS, "select the bit interleave backend: auto, portable, bmi2 or avx2."},
 	{NULL, NULL, 0, NULL}
 };
 
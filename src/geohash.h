@@ -1,3 +1,7 @@
+#if !defined(_MSC_VER) || (_MSC_VER > 1500)
+#include <stdint.h>
+#endif
+
 #ifdef __cplusplus
 extern "C" {
 #endif
@@ -14,6 +18,11 @@ enum {
 int geohash_encode(double latitude, double longitude, char* r, size_t capacity);
 int geohash_decode(char* r, size_t length, double *latitude, double *longitude);
 int geo_neighbors(char *hashcode, char* dst, size_t dst_length, int *string_count);
+int geohash_encode_many(const double *latitudes, const double *longitudes, size_t count,
+		char *r, size_t precision, size_t *failed);
+int geoint_encode_many(const double *latitudes, const double *longitudes, size_t count,
+		uint64_t *r, size_t *failed);
+int geoint_argsort(uint64_t *keys, size_t count, int bits, uint64_t *order);
 
 #ifdef __cplusplus
 }